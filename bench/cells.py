@@ -0,0 +1,52 @@
+""" Memory and time per ``Cell``: creates a million cells and keeps
+them alive, like a fully read table does. The baseline is the cell of
+messytables 0.14, which has an instance ``__dict__`` and creates a new
+``StringType`` for each cell. Each variant runs in its own process, so
+that memory freed by one does not hide the memory used by the other;
+``python bench/cells.py current`` runs one of them alone. """
+import gc
+import subprocess
+import sys
+
+from common import timed, rss
+
+from messytables import Cell
+
+COUNT = 1000000
+
+
+class BaselineCell(object):
+    """ ``Cell`` as it was before it had ``__slots__``. """
+
+    def __init__(self, value, column=None, type=None):
+        if type is None:
+            from messytables.types import StringType
+            type = StringType()
+        self.value = value
+        self.column = column
+        self.column_autogenerated = False
+        self.type = type
+
+
+VARIANTS = {'baseline': BaselineCell, 'current': Cell}
+
+
+def measure(variant):
+    cls = VARIANTS[variant]
+    gc.collect()
+    before = rss()
+    cells, seconds = timed('%d cells, %s' % (COUNT, variant),
+                           lambda: [cls(u'x') for _ in xrange(COUNT)])
+    size = (rss() - before) / float(COUNT)
+    print '%-44s %8.0f bytes' % ('memory per cell, ' + variant, size)
+    print '%-44s %8.0f cells/sec' % ('throughput, ' + variant,
+                                     COUNT / seconds)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        measure(sys.argv[1])
+    else:
+        for variant in ('baseline', 'current'):
+            sys.stdout.flush()
+            subprocess.check_call([sys.executable, __file__, variant])
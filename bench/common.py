@@ -0,0 +1,87 @@
+""" Helpers shared by the benchmark scripts in this directory.
+
+The scripts are run from the root of the repository, for example
+``python bench/cells.py``, and print their timings. They measure the
+working tree they are run in, so compare a run on your branch with a
+run on master to spot regressions. Where a script has a baseline, it
+also times a copy of the code the optimisation replaced. """
+import decimal
+import locale
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(label, func, *args, **kwargs):
+    """ Call ``func`` and print how long it took. Returns the result
+    and the time in seconds. """
+    start = time.time()
+    result = func(*args, **kwargs)
+    seconds = time.time() - start
+    print '%-44s %8.2fs' % (label, seconds)
+    return result, seconds
+
+
+def rss():
+    """ The resident set size of this process in bytes (Linux only). """
+    with open('/proc/self/statm') as fh:
+        pages = int(fh.read().split()[1])
+    return pages * resource.getpagesize()
+
+
+def max_rss():
+    """ The peak resident set size of this process in megabytes. """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def consume(iterable):
+    """ Run through an iterable, returning the number of items. """
+    count = 0
+    for _ in iterable:
+        count += 1
+    return count
+
+
+def csv_file(rows, columns, value=None, header=True, seed=0):
+    """ Write a synthetic CSV file to a temporary path and return the
+    path. Cells are made by ``value(rownum, colnum)``, or are small
+    integers by default. """
+    rng = random.Random(seed)
+    if value is None:
+        value = lambda rownum, colnum: str(rng.randint(0, 100000))
+    fd, path = tempfile.mkstemp(suffix='.csv', prefix='messytables-bench-')
+    with os.fdopen(fd, 'wb') as fh:
+        if header:
+            fh.write(','.join('col%d' % i for i in xrange(columns)) + '\n')
+        for rownum in xrange(rows):
+            fh.write(','.join(value(rownum, colnum)
+                              for colnum in xrange(columns)) + '\n')
+    return path
+
+
+def baseline_integer(value):
+    """ ``IntegerType.cast`` as it was in messytables 0.14. """
+    if value in ('', None):
+        return None
+    try:
+        return int(value)
+    except:
+        return locale.atoi(value)
+
+
+def baseline_decimal(value):
+    """ ``DecimalType.cast`` as it was in messytables 0.14. """
+    if value in ('', None):
+        return None
+    try:
+        return decimal.Decimal(value)
+    except:
+        value = locale.atof(value)
+        if sys.version_info < (2, 7):
+            value = str(value)
+        return decimal.Decimal(value)
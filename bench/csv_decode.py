@@ -0,0 +1,41 @@
+""" Decoding CSV input: reads a synthetic 400k-row file with
+``raw_values``, once encoded as UTF-8 and once as UTF-16. """
+import codecs
+import os
+
+from common import timed, consume, csv_file
+
+from messytables import CSVTableSet
+
+ROWS = 400000
+WORDS = [u'Galway', u'K\xf6ln', u'Z\xfcrich', u'\u0141\xf3d\u017a', u'Oslo']
+
+
+def value(rownum, colnum):
+    if colnum % 2:
+        return str(rownum * colnum)
+    return WORDS[(rownum + colnum) % len(WORDS)].encode('utf-8')
+
+
+def read(path, encoding):
+    with open(path, 'rb') as fh:
+        row_set = CSVTableSet(fh, encoding=encoding).tables[0]
+        return consume(row_set.raw_values())
+
+
+if __name__ == '__main__':
+    utf8 = csv_file(ROWS, 6, value)
+    utf16 = utf8 + '.utf16'
+    with codecs.open(utf8, 'rb', 'utf-8') as src:
+        with codecs.open(utf16, 'wb', 'utf-16') as dst:
+            dst.write(src.read())
+    try:
+        for label, path, encoding in (('UTF-8', utf8, 'utf-8'),
+                                      ('UTF-16', utf16, 'utf-16')):
+            size = os.path.getsize(path) / 1024.0 / 1024.0
+            _, seconds = timed('raw_values, %s (%.0f MB)' % (label, size),
+                               read, path, encoding)
+            print '%-44s %8.0f rows/sec' % ('', ROWS / seconds)
+    finally:
+        os.remove(utf8)
+        os.remove(utf16)
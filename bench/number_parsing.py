@@ -0,0 +1,48 @@
+""" Number parsing: the casters of ``IntegerType`` and ``DecimalType``
+on 100k values each of plain integers, plain decimals, numbers with a
+thousands separator and non-numeric text, in the ``en_US`` locale if it
+is available. The baseline is the casts of messytables 0.14, which try
+``int()``/``Decimal()`` and fall back to ``locale.atoi``/``atof``. """
+import locale
+import random
+
+from common import timed, baseline_integer, baseline_decimal
+
+from messytables import IntegerType, DecimalType
+
+COUNT = 100000
+
+
+def cast_all(cast, values):
+    for value in values:
+        try:
+            cast(value)
+        except ValueError:
+            pass
+
+
+if __name__ == '__main__':
+    for name in ('en_US.UTF-8', 'en_US.utf8', 'C'):
+        try:
+            locale.setlocale(locale.LC_ALL, name)
+            break
+        except locale.Error:
+            pass
+    print 'locale: %s' % (locale.setlocale(locale.LC_NUMERIC),)
+    rng = random.Random(0)
+    integer = IntegerType().caster()
+    decimal = DecimalType().caster()
+    samples = [
+        ('integers', integer, baseline_integer,
+         [u'%d' % rng.randint(-10 ** 6, 10 ** 6) for _ in xrange(COUNT)]),
+        ('decimals', decimal, baseline_decimal,
+         [u'%.3f' % rng.uniform(-1000, 1000) for _ in xrange(COUNT)]),
+        ('"1,234.50"', decimal, baseline_decimal,
+         [u'{0:,.2f}'.format(rng.uniform(1000, 10 ** 6))
+          for _ in xrange(COUNT)]),
+        ('dirty (n/a), integer', integer, baseline_integer, [u'n/a'] * COUNT),
+        ('dirty (n/a), decimal', decimal, baseline_decimal, [u'n/a'] * COUNT),
+    ]
+    for label, cast, baseline, values in samples:
+        timed(label + ', baseline', cast_all, baseline, values)
+        timed(label + ', current', cast_all, cast, values)
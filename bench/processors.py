@@ -0,0 +1,58 @@
+""" Overhead of the processor chain: 50k rows of 5 columns held in
+memory, read with headers, offset, null and string type processors
+(so that no real casting is done). The fused chain of
+``RowSet.__iter__`` is compared with calling each processor in turn. """
+from common import timed, consume
+
+from messytables import (RowSet, Cell, StringType, headers_processor,
+                         offset_processor, null_processor, types_processor)
+from messytables.core import slice_rows
+
+ROWS = 50000
+COLUMNS = 5
+
+
+class MemoryRowSet(RowSet):
+    """ Rows of values held in a list; only ``skip`` and ``limit`` are
+    honoured by ``raw``, which is all this benchmark needs. """
+
+    def __init__(self, rows):
+        self.rows = rows
+        super(MemoryRowSet, self).__init__()
+
+    def raw(self, sample=False, skip=0, limit=None, columns=None,
+            where=None):
+        for values in slice_rows(self.rows, skip, limit):
+            yield [Cell(value) for value in values]
+
+
+def unfused(row_set, processors):
+    for row in row_set.raw():
+        for processor in processors:
+            row = processor(row_set, row)
+            if row is None:
+                break
+        else:
+            yield row
+    row_set._offset = 0
+
+
+if __name__ == '__main__':
+    rows = [[u'h%d' % i for i in xrange(COLUMNS)]]
+    rows.extend([u'%d' % (r * i) if i % 2 else u'' for i in xrange(COLUMNS)]
+                for r in xrange(ROWS))
+    row_set = MemoryRowSet(rows)
+    processors = [headers_processor(rows[0]), offset_processor(1),
+                  null_processor([u'']), types_processor([StringType()] *
+                                                         COLUMNS)]
+    for processor in processors:
+        row_set.register_processor(processor)
+
+    _, raw = timed('raw cells', consume, row_set.raw())
+    _, fused = timed('fused chain', consume, row_set)
+    _, plain = timed('processors called in turn', consume,
+                     unfused(row_set, processors))
+    for label, seconds in (('fused chain', fused),
+                           ('processors called in turn', plain)):
+        print '%-44s %8.0f rows/sec' % (label + ' overhead',
+                                       ROWS / max(seconds - raw, 1e-6))
@@ -0,0 +1,37 @@
+""" Column projection: a 5000 x 300 CSV file of integers, read with
+headers, offset and integer type processors, in full and with 5 of
+its columns selected. """
+import os
+
+from common import timed, consume, csv_file
+
+from messytables import (CSVTableSet, IntegerType, headers_guess,
+                         headers_processor, offset_processor,
+                         types_processor)
+
+ROWS = 5000
+COLUMNS = 300
+SELECTED = ['col0', 'col50', 'col120', 'col200', 'col299']
+
+
+def row_set(path, columns=None):
+    fh = open(path, 'rb')
+    row_set = CSVTableSet(fh).tables[0]
+    offset, headers = headers_guess(row_set.sample)
+    row_set.register_processor(headers_processor(headers))
+    row_set.register_processor(offset_processor(offset + 1))
+    row_set.register_processor(types_processor([IntegerType()] * COLUMNS))
+    row_set.select(columns)
+    return row_set
+
+
+if __name__ == '__main__':
+    path = csv_file(ROWS, COLUMNS)
+    try:
+        for label, columns in (('all columns', None),
+                               ('%d columns' % len(SELECTED), SELECTED)):
+            timed('iterate, ' + label, consume, row_set(path, columns))
+            timed('tuples, ' + label, consume,
+                  row_set(path, columns).tuples())
+    finally:
+        os.remove(path)
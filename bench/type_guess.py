@@ -0,0 +1,94 @@
+""" Type guessing: ``type_guess`` on the sample of a 1000 x 50 table of
+integers, decimals, booleans, text and codes, and on a single column of
+200 distinct dates. The baseline is the guesser of messytables 0.14,
+which tests every value against every type by casting it, with the
+number casts of that version and ``strptime`` for dates. """
+from collections import defaultdict
+import datetime
+import random
+import StringIO
+
+from common import timed, baseline_integer, baseline_decimal
+
+from messytables import (CSVTableSet, type_guess, StringType, IntegerType,
+                         DecimalType, DateType)
+from messytables.dateparser import is_date
+from messytables.types import TYPES
+
+ROWS = 1000
+COLUMNS = 50
+DATES = 200
+
+
+def mixed_csv(rows, columns, seed=0):
+    rng = random.Random(seed)
+    makers = [lambda: str(rng.randint(-10000, 10000)),
+              lambda: '%.2f' % rng.uniform(-1000, 1000),
+              lambda: rng.choice(['true', 'false', 'yes', 'no']),
+              lambda: rng.choice(['Galway', 'Berlin', 'Oslo', 'n/a']),
+              lambda: 'AB-%04d' % rng.randint(0, 9999)]
+    lines = [','.join('col%d' % i for i in xrange(columns))]
+    for _ in xrange(rows):
+        lines.append(','.join(makers[i % len(makers)]()
+                              for i in xrange(columns)))
+    return '\n'.join(lines) + '\n'
+
+
+def dates_csv(count):
+    start = datetime.date(2000, 1, 1)
+    return 'date\n' + ''.join((start + datetime.timedelta(days=i * 37))
+                              .strftime('%d/%m/%Y\n') for i in xrange(count))
+
+
+def baseline_test(type, value):
+    """ ``CellType.test`` as it was in messytables 0.14. """
+    if isinstance(value, type.result_type):
+        return True
+    cast = type.cast
+    if isinstance(type, IntegerType):
+        cast = baseline_integer
+    elif isinstance(type, DecimalType):
+        cast = baseline_decimal
+    elif isinstance(type, DateType):
+        if not is_date(value):
+            return False
+        cast = lambda value: datetime.datetime.strptime(value, type.format)
+    try:
+        cast(value)
+        return True
+    except:
+        return False
+
+
+def baseline_type_guess(rows, types=TYPES):
+    """ ``type_guess`` as it was in messytables 0.14 (not strict). """
+    guesses = []
+    type_instances = [i for t in types for i in t.instances()]
+    for row in rows:
+        for _ in xrange(len(row) - len(guesses)):
+            guesses.append(defaultdict(int))
+        for i, cell in enumerate(row):
+            guesses[i][StringType()] = guesses[i].get(StringType(), 0)
+            if not cell.value:
+                continue
+            for type in type_instances:
+                if baseline_test(type, cell.value):
+                    guesses[i][type] += type.guessing_weight
+    return [max([(t, guess[t]) for t in type_instances if t in guess],
+                key=lambda (t, n): n)[0] for guess in guesses]
+
+
+def guess(data, guesser):
+    row_set = CSVTableSet(StringIO.StringIO(data)).tables[0]
+    return guesser(row_set.sample)
+
+
+if __name__ == '__main__':
+    for label, data in (('%d x %d mixed values' % (ROWS, COLUMNS),
+                         mixed_csv(ROWS, COLUMNS)),
+                        ('%d distinct dates' % DATES, dates_csv(DATES))):
+        expected, _ = timed(label + ', baseline', guess, data,
+                            baseline_type_guess)
+        result, _ = timed(label + ', current', guess, data, type_guess)
+        if result != expected:
+            print 'the guessed types differ:', expected, result
@@ -1,15 +1,17 @@
 
-from messytables.util import offset_processor, null_processor
+from messytables.util import offset_processor, null_processor, filter_processor
 from messytables.headers import headers_guess, headers_processor, headers_make_unique
-from messytables.types import type_guess, types_processor
+from messytables.types import type_guess, types_processor, TypeGuesser, \
+        CastRejects
 from messytables.types import StringType, IntegerType, FloatType, \
-        DecimalType, DateType, DateUtilType, BoolType
+        DecimalType, DateType, DateUtilType, BoolType, NumberFormat
 from messytables.error import ReadError
 
 from messytables.core import Cell, TableSet, RowSet, seekable_stream
 from messytables.commas import CSVTableSet, CSVRowSet
 from messytables.ods import ODSTableSet, ODSRowSet
 from messytables.excel import XLSTableSet, XLSRowSet
+from messytables.excelx import XLSXStreamTableSet, XLSXStreamRowSet
 
 # XLSXTableSet has been deprecated and its functionality is now provided by
 # XLSTableSet. This is to retain backwards compatibility with anyone
@@ -1,5 +1,5 @@
 from messytables import (ZIPTableSet, PDFTableSet, CSVTableSet, XLSTableSet,
-                         HTMLTableSet, ODSTableSet)
+                         HTMLTableSet, ODSTableSet, XLSXStreamTableSet)
 import messytables
 import re
 
@@ -17,8 +17,8 @@ MIMELOOKUP = {'application/x-zip-compressed': 'ZIP',
               'application/vnd.ms-excel': 'XLS',
               'application/octet-stream': 'XLS', # libmagic detects sw_gen as this on mac
                                                  # with text "Microsoft OOXML"
-              'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': 'XLS',
-              'application/vnd.openxmlformats-officedocument.spreadsheetml.sheetapplication/zip': 'XLS',
+              'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': 'XLSX',
+              'application/vnd.openxmlformats-officedocument.spreadsheetml.sheetapplication/zip': 'XLSX',
               'text/html': 'HTML',
               'application/xml': 'HTML', # XHTML is often served as application-xml
               'application/pdf': 'PDF',
@@ -31,9 +31,21 @@ MIMELOOKUP = {'application/x-zip-compressed': 'ZIP',
 def TABTableSet(fileobj):
     return CSVTableSet(fileobj, delimiter='\t')
 
+def OOXMLTableSet(fileobj):
+    """ Stream OOXML workbooks with ``XLSXStreamTableSet``, but leave
+    files which are not zip archives (like old Excel files with a new
+    extension) to ``XLSTableSet``. """
+    fileobj = messytables.seekable_stream(fileobj)
+    header = fileobj.read(4)
+    fileobj.seek(0)
+    if header != 'PK\x03\x04':
+        return XLSTableSet(fileobj)
+    return XLSXStreamTableSet(fileobj)
+
 parsers = {'TAB': TABTableSet,
            'ZIP': ZIPTableSet,
            'XLS': XLSTableSet,
+           'XLSX': OOXMLTableSet,
            'HTML': HTMLTableSet,
            'CSV': CSVTableSet,
            'ODS': ODSTableSet,
@@ -94,7 +106,7 @@ def guess_ext(ext):
               'csv': 'CSV',
               'tsv': 'TAB',
               'xls': 'XLS',
-              'xlsx': 'XLS',
+              'xlsx': 'XLSX',
               'htm': 'HTML',
               'html': 'HTML',
               'pdf': 'PDF',
@@ -102,9 +114,9 @@ def guess_ext(ext):
                 # obscure Excel extensions taken from
                 # http://en.wikipedia.org/wiki/List_of_Microsoft_Office_filename_extensions
               'xlm': 'XLS',
-              'xlsm': 'XLS',
-              'xltx': 'XLS',
-              'xltm': 'XLS',
+              'xlsm': 'XLSX',
+              'xltx': 'XLSX',
+              'xltm': 'XLSX',
               'ods': 'ODS'}
     if ext in lookup:
         return lookup.get(ext, None)
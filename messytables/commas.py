@@ -1,16 +1,29 @@
-from ilines import ilines
+from array import array
+from collections import defaultdict, deque
+from functools import partial
+from itertools import islice, izip
 import csv
+import os
+import multiprocessing
 import codecs
+import re
 import chardet
 
-from messytables.core import RowSet, TableSet, Cell
+from messytables.core import (RowSet, TableSet, Cell, BufferedFile,
+                              slice_rows, project_row, filter_rows,
+                              row_matches, sample_positions, sample_rows)
+from messytables.util import ValueDictionary
 import messytables
 
 
 class UTF8Recoder:
     """
-    Iterator that reads an encoded stream and re-encodes the input to UTF-8
+    Iterator that reads an encoded stream in blocks and re-encodes the input
+    to UTF-8. Input which is already UTF-8 or ASCII is passed through as it
+    is, and is only decoded cell by cell once it has been parsed.
     """
+    block_size = 1024 * 1024
+
     def __init__(self, f, encoding):
         sample = f.read(2000)
         if not encoding:
@@ -21,13 +34,18 @@ class UTF8Recoder:
                 # a semi-sane encoding
                 encoding = 'utf-8'
         f.seek(0)
-        self.reader = codecs.getreader(encoding)(f, 'ignore')
+        self.f = f
+        self.encoding = encoding
+        if codecs.lookup(encoding).name in ('utf-8', 'ascii'):
+            self.decoder = None
+        else:
+            self.decoder = codecs.getincrementaldecoder(encoding)('ignore')
 
-        # The reader only skips a BOM if the encoding isn't explicit about its
-        # endianness (i.e. if encoding is UTF-16 a BOM is handled properly
+        # The decoder only skips a BOM if the encoding isn't explicit about
+        # its endianness (i.e. if encoding is UTF-16 a BOM is handled properly
         # and taken out, but if encoding is UTF-16LE a BOM is ignored).
         # However, if chardet sees a BOM it returns an encoding with the
-        # endianness explicit, which results in the codecs stream leaving the
+        # endianness explicit, which results in the decoder leaving the
         # BOM in the stream. This is ridiculously dumb. For UTF-{16,32}{LE,BE}
         # encodings, check for a BOM and remove it if it's there.
         if encoding in ("UTF-16LE", "UTF-16BE", "UTF-32LE", "UTF-32BE"):
@@ -47,11 +65,257 @@ class UTF8Recoder:
         return self
 
     def next(self):
-        line = self.reader.readline()
-        if not line or line == '\0':
-            raise StopIteration
-        result = line.encode("utf-8")
-        return result
+        while True:
+            block = self.f.read(self.block_size)
+            if self.decoder is None:
+                if not block:
+                    raise StopIteration
+                return block
+            text = self.decoder.decode(block, not block)
+            if text:
+                return text.encode('utf-8')
+            if not block:
+                raise StopIteration
+
+
+def split_lines(blocks):
+    """ Split a stream of data blocks into lines, turning CR and CRLF
+    line endings into LF. Each line keeps its terminator, except
+    possibly the last one. """
+    pending = ''
+    for block in blocks:
+        data = pending + block
+        # a CR at the end of the block may be followed by a LF in the next
+        carry = data.endswith('\r')
+        if carry:
+            data = data[:-1]
+        if '\r' in data:
+            data = data.replace('\r\n', '\n').replace('\r', '\n')
+        lines = data.splitlines(True)
+        if lines and not lines[-1].endswith('\n'):
+            pending = lines.pop()
+        else:
+            pending = ''
+        if carry:
+            pending += '\r'
+        for line in lines:
+            yield line
+    if pending.endswith('\r'):
+        pending = pending[:-1] + '\n'
+    if pending:
+        yield pending
+
+
+# Candidate delimiters for dialect detection.
+DELIMITERS = [',', '\t', ';', '|']
+
+# The size of the reads at each byte offset of a spread CSV sample.
+SAMPLE_READ_SIZE = 4096
+
+# The number of bytes at the start of the sample used to detect the dialect.
+SNIFF_BUDGET = 64 * 1024
+
+# A line fits a delimiter if it has the modal number of occurrences. The
+# fast detector gives up if fewer than this share of lines fit.
+SNIFF_CONSISTENCY = 0.9
+
+QUOTED = re.compile(r'"[^"]*"')
+QUOTE_AFTER_DELIMITER = re.compile(r'([\t,;|])( ?)"[^"]*"(?= ?[\t,;|]|$)',
+                                   re.MULTILINE)
+SINGLE_QUOTED = re.compile(r"(?:^|[\t,;|]) ?'[^'\n]*'(?: ?[\t,;|]|$)",
+                           re.MULTILINE)
+
+
+def sniff_dialect(lines, delimiters=DELIMITERS, budget=SNIFF_BUDGET):
+    """ Detect the CSV dialect of the given lines, looking at no more
+    than ``budget`` bytes. The delimiter is the candidate which occurs
+    the same number of times on most lines, outside of quotes. Only if
+    that is ambiguous, or fields seem to be quoted with ``'``, is
+    ``csv.Sniffer`` consulted. Returns ``None`` if no dialect could be
+    detected. """
+    sample = []
+    size = 0
+    for line in lines:
+        if size and size + len(line) > budget:
+            break
+        sample.append(line)
+        size += len(line)
+    text = ''.join(sample)
+
+    if not SINGLE_QUOTED.search(text):
+        delimiter = _consistent_delimiter(text, delimiters)
+        if delimiter is not None:
+            return _make_dialect(text, delimiter)
+
+    try:
+        return csv.Sniffer().sniff('\n'.join(sample), delimiters=delimiters)
+    except csv.Error:
+        return None
+
+
+def _consistent_delimiter(text, delimiters):
+    lines = [l for l in QUOTED.sub('', text).split('\n') if l.strip()]
+    if not lines:
+        return None
+    fits = []
+    for delimiter in delimiters:
+        counts = defaultdict(int)
+        for line in lines:
+            counts[line.count(delimiter)] += 1
+        mode = max(counts, key=lambda c: (counts[c], c))
+        if mode > 0:
+            fits.append((float(counts[mode]) / len(lines), delimiter))
+    fits = [f for f in fits if f[0] >= SNIFF_CONSISTENCY]
+    if len(fits) != 1:
+        return None
+    return fits[0][1]
+
+
+def _make_dialect(text, delimiter):
+    quoted = [m for m in QUOTE_AFTER_DELIMITER.finditer(text)
+              if m.group(1) == delimiter]
+    if quoted:
+        skipinitialspace = any(m.group(2) for m in quoted)
+    else:
+        first = [l for l in text.split('\n') if l][0]
+        skipinitialspace = (first.count(delimiter) ==
+                            first.count(delimiter + ' '))
+
+    class dialect(csv.Dialect):
+        _name = "sniffed"
+        lineterminator = '\r\n'
+        quoting = csv.QUOTE_MINIMAL
+    dialect.delimiter = delimiter
+    dialect.quotechar = '"'
+    dialect.doublequote = True
+    dialect.skipinitialspace = skipinitialspace
+    return dialect
+
+
+def raw_lines(fileobj, block_size=1024 * 1024):
+    """ Read a file in blocks and yield its lines with their original
+    line endings, so that the lengths add up to byte offsets. """
+    pending = ''
+    while True:
+        block = fileobj.read(block_size)
+        if not block:
+            break
+        lines = (pending + block).splitlines(True)
+        # a line ending in CR may continue with LF in the next block
+        if lines[-1].endswith('\n'):
+            pending = ''
+        else:
+            pending = lines.pop()
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def record_chunks(blocks, chunk_size, quotechar='"'):
+    """ Join a stream of data blocks into chunks of at least
+    ``chunk_size`` bytes which end at a record boundary: a newline
+    which is not inside a quoted field. This assumes that the quote
+    character only occurs around quoted fields and doubled inside
+    them, as in the default CSV dialect. """
+    parts = []
+    size = 0
+    for block in blocks:
+        parts.append(block)
+        size += len(block)
+        if size < chunk_size:
+            continue
+        data = ''.join(parts)
+        end = _record_boundary(data, quotechar)
+        if end is None:
+            parts = [data]
+            continue
+        yield data[:end]
+        parts = [data[end:]]
+        size = len(parts[0])
+    data = ''.join(parts)
+    if data:
+        yield data
+
+
+def _record_boundary(data, quotechar):
+    """ Return the position after the last newline in ``data`` that is
+    preceded by an even number of quote characters, or ``None``. """
+    end = len(data)
+    quotes = data.count(quotechar) if quotechar else 0
+    while True:
+        newline = data.rfind('\n', 0, end)
+        if newline < 0:
+            return None
+        if quotechar:
+            quotes -= data.count(quotechar, newline, end)
+        if quotes % 2 == 0:
+            return newline + 1
+        end = newline
+
+
+def _parse_chunk(args):
+    """ Parse a chunk of UTF-8 encoded CSV in a worker process and apply
+    the value-level form of the given built-in processor specs, except
+    for offsets, which depend on the position in the table. Returns the
+    rows as tuples, a dict mapping row numbers to the index of the
+    processor which failed on them and the exception, and the message
+    of a CSV error which ended parsing, if any. """
+    data, params, specs = args
+    processors = []
+    for i, spec in enumerate(specs):
+        kind = spec[0]
+        if kind == 'headers':
+            processors.append((i, messytables.headers_processor(*spec[1:])))
+        elif kind == 'null':
+            processors.append((i, messytables.null_processor(spec[1])))
+        elif kind == 'types':
+            processors.append((i, messytables.types_processor(*spec[1:])))
+    processors = [(i, p.on_values) for i, p in processors]
+
+    csv.field_size_limit(256000)
+    rows = []
+    errors = {}
+    try:
+        for row in csv.reader(split_lines([data]), **params):
+            row = [c.decode('utf-8', 'ignore') for c in row]
+            for i, processor in processors:
+                try:
+                    row = processor(None, row)
+                except Exception, exc:
+                    errors[len(rows)] = (i, exc)
+                    break
+            rows.append(tuple(row))
+    except csv.Error, err:
+        return rows, errors, unicode(err)
+    return rows, errors, None
+
+
+def _field(row, i):
+    """ Decode field ``i`` of a parsed CSV row, if the row has it. """
+    if i < len(row):
+        return row[i].decode('utf-8', 'ignore')
+
+
+def _decode(value):
+    return value.decode('utf-8', 'ignore')
+
+
+def dictionary_decoder(size):
+    """ Return a function which decodes a parsed CSV row, or the given
+    columns of it, keeping a ``ValueDictionary`` of up to ``size``
+    values for each column. """
+    lookups = []
+
+    def decode_row(row, columns=None):
+        width = len(row)
+        while len(lookups) < width:
+            lookups.append(ValueDictionary(size, _decode).lookup)
+        if columns is None:
+            return [lookup(value) for lookup, value in izip(lookups, row)]
+        return [lookups[i](row[i]) if i < width else None
+                for i in columns]
+    return decode_row
 
 
 def to_unicode_or_bust(obj, encoding='utf-8'):
@@ -102,8 +366,10 @@ class CSVRowSet(RowSet):
         self.name = name
         seekable_fileobj = messytables.seekable_stream(fileobj)
         self.fileobj = UTF8Recoder(seekable_fileobj, encoding)
-        self.lines = ilines(self.fileobj)
+        self.lines = split_lines(self.fileobj)
         self._sample = []
+        self._sniffed_dialect = None
+        self.row_index = None
         self.delimiter = delimiter
         self.quotechar = quotechar
         self.window = window or 1000
@@ -119,16 +385,17 @@ class CSVRowSet(RowSet):
 
     @property
     def _dialect(self):
-        delim = '\n'
-        sample = delim.join(self._sample)
-        try:
-            dialect = csv.Sniffer().sniff(sample,
-                delimiters=['\t', ',', ';', '|'])
-            dialect.lineterminator = delim
-            dialect.doublequote = True
-            return dialect
-        except csv.Error:
-            return csv.excel
+        """ The dialect detected from the sample, computed on first
+        use. """
+        if self._sniffed_dialect is None:
+            dialect = sniff_dialect(self._sample)
+            if dialect is None:
+                dialect = csv.excel
+            else:
+                dialect.lineterminator = '\n'
+                dialect.doublequote = True
+            self._sniffed_dialect = dialect
+        return self._sniffed_dialect
 
     @property
     def _overrides(self):
@@ -146,7 +413,299 @@ class CSVRowSet(RowSet):
             d['skipinitialspace'] = self.skipinitialspace
         return d
 
-    def raw(self, sample=False):
+    @property
+    def _reader_params(self):
+        """ The detected dialect with the overrides applied, as keyword
+        arguments for ``csv.reader``. """
+        params = dict((name, getattr(self._dialect, name)) for name in (
+            'delimiter', 'quotechar', 'escapechar', 'doublequote',
+            'skipinitialspace', 'lineterminator', 'quoting'))
+        params.update(self._overrides)
+        return params
+
+    @property
+    def _quotechar(self):
+        params = self._reader_params
+        if params['quoting'] == csv.QUOTE_NONE:
+            return None
+        return params['quotechar']
+
+    def raw(self, sample=False, skip=0, limit=None, columns=None,
+            where=None):
+        for row in self.raw_values(sample=sample, skip=skip, limit=limit,
+                                   columns=columns, where=where):
+            yield [Cell(value) for value in row]
+
+    def __nonzero__(self):
+        return True
+
+    def __len__(self):
+        """ The number of records in the file. This requires the row
+        index, see ``build_index``. """
+        return len(self._require_index()) - 1
+
+    def __getitem__(self, key):
+        """ Read a record, or a slice of records, from the file as lists
+        of cells, using the row index (see ``build_index``). Records are
+        counted from the start of the file and the registered processors
+        are not applied. """
+        count = len(self)
+        if isinstance(key, slice):
+            numbers = range(*key.indices(count))
+            if not numbers:
+                return []
+            first = min(numbers)
+            rows = self._read_records(first, max(numbers) + 1)
+            return [[Cell(value) for value in rows[n - first]]
+                    for n in numbers]
+        if key < 0:
+            key += count
+        if not 0 <= key < count:
+            raise IndexError("record index out of range")
+        return [Cell(value) for value in self._read_records(key, key + 1)[0]]
+
+    def build_index(self):
+        """ Scan the file once and build the row index: an array of the
+        byte offsets at which its records start, followed by the size of
+        the file. Records are split at line endings which are not inside
+        quoted fields. The index makes ``len()``, indexing and slicing of
+        the row set possible without reading the whole file; it requires
+        a seekable UTF-8 or ASCII source. """
+        source = self._indexable_source()
+        quotechar = self._quotechar
+        position = source.tell()
+        source.seek(0)
+        offsets = array('L', [0])
+        offset = 0
+        quoted = False
+        try:
+            for line in raw_lines(source):
+                offset += len(line)
+                if quotechar and line.count(quotechar) % 2:
+                    quoted = not quoted
+                if not quoted:
+                    offsets.append(offset)
+            if offsets[-1] != offset:
+                offsets.append(offset)
+        finally:
+            source.seek(position)
+        self.row_index = offsets
+        return offsets
+
+    def save_index(self, filename):
+        """ Write the row index to a sidecar file. The file uses the
+        native size and byte order of unsigned longs. """
+        fh = open(filename, 'wb')
+        try:
+            self._require_index().tofile(fh)
+        finally:
+            fh.close()
+
+    def load_index(self, filename):
+        """ Load a row index written by ``save_index``. """
+        offsets = array('L')
+        fh = open(filename, 'rb')
+        try:
+            offsets.fromfile(fh, os.path.getsize(filename) // offsets.itemsize)
+        finally:
+            fh.close()
+        self.row_index = offsets
+        return offsets
+
+    def _require_index(self):
+        if self.row_index is None:
+            raise TypeError("The row set has no row index, "
+                            "use build_index() or load_index() first")
+        return self.row_index
+
+    def _indexable_source(self):
+        source = self.fileobj.f
+        if isinstance(source, BufferedFile) or \
+                self.fileobj.decoder is not None:
+            raise TypeError("A row index requires a seekable UTF-8 "
+                            "or ASCII source")
+        return source
+
+    def _read_records(self, start, stop):
+        """ Parse the records from ``start`` up to ``stop`` by reading
+        their byte range from the source. """
+        offsets = self._require_index()
+        source = self._indexable_source()
+        position = source.tell()
+        try:
+            source.seek(offsets[start])
+            data = source.read(offsets[stop] - offsets[start])
+        finally:
+            source.seek(position)
+        csv.field_size_limit(256000)
+        rows = csv.reader(split_lines([data]), **self._reader_params)
+        if self.dictionary_size:
+            return map(dictionary_decoder(self.dictionary_size), rows)
+        return [[c.decode('utf-8', 'ignore') for c in row] for row in rows]
+
+    def parallel_tuples(self, workers=None, chunk_size=4 * 1024 * 1024):
+        """ Like ``tuples``, but parse the file and apply the processors
+        in a pool of ``workers`` processes (one per CPU by default). The
+        file is split into chunks of about ``chunk_size`` bytes at record
+        boundaries, and rows are yielded in their original order.
+
+        This reads the file from its start, so like the main iterator it
+        can only be used once. If the source is not seekable, a custom
+        processor or a filter is registered, the dialect uses an escape
+        character, columns have been selected or cast errors are
+        collected (see ``CastRejects``), the rows are read by ``tuples``
+        instead. """
+        specs = [getattr(p, 'builtin', None)
+                 for p in self._with_settings(self._processors)]
+        params = self._reader_params
+        source = self.fileobj.f
+        if None in specs or params['escapechar'] or \
+                isinstance(source, BufferedFile) or \
+                self._columns is not None or \
+                'filter' in [spec[0] for spec in specs] or \
+                [spec for spec in specs
+                 if spec[0] == 'types' and spec[3] is not None]:
+            for row in self.tuples():
+                yield row
+            return
+
+        blocks = UTF8Recoder(source, self.fileobj.encoding)
+        chunks = record_chunks(blocks, chunk_size, self._quotechar)
+        workers = workers or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(workers)
+        try:
+            pending = deque()
+            while True:
+                if len(pending) < 2 * workers:
+                    chunk = next(chunks, None)
+                    if chunk is not None:
+                        pending.append(pool.apply_async(
+                            _parse_chunk, ((chunk, params, specs),)))
+                        continue
+                if not pending:
+                    break
+                rows, errors, csv_error = pending.popleft().get()
+                for row in self._finish_rows(rows, errors):
+                    yield row
+                if csv_error is not None:
+                    if 'line contains NULL byte' in csv_error:
+                        return
+                    raise messytables.ReadError(
+                        'Error reading CSV: %r' % csv_error)
+        finally:
+            pool.terminate()
+            self._offset = 0
+
+    def _finish_rows(self, rows, errors):
+        """ Finish the rows parsed by ``_parse_chunk``: apply the offset
+        processors and raise processor errors for rows which are not
+        skipped, in processor order. """
+        offsets = [p for p in self._processors if p.builtin[0] == 'offset']
+        if not offsets and not errors:
+            for row in rows:
+                yield row
+            return
+        for n, row in enumerate(rows):
+            error = errors.get(n)
+            for i, processor in enumerate(self._processors):
+                if processor.builtin[0] == 'offset':
+                    if processor(self, row) is None:
+                        break
+                elif error is not None and error[0] == i:
+                    raise error[1]
+            else:
+                yield row
+
+    def _sample_key(self):
+        return (tuple(sorted(self._overrides.items())), self.sampling,
+                self.sample_head)
+
+    def raw_values(self, sample=False, skip=0, limit=None, columns=None,
+                   where=None):
+        if sample or (self.row_index is not None and limit is not None):
+            if sample:
+                rows = self._cached_sample(self._parse_sample)
+                rows = slice_rows(rows, skip, limit)
+            else:
+                stop = min(skip + limit, len(self))
+                rows = self._read_records(min(skip, stop), stop)
+            for row in filter_rows(rows, where):
+                yield list(row) if columns is None else \
+                    project_row(row, columns)
+        else:
+            for row in self._parse(skip=skip, limit=limit, columns=columns,
+                                   where=where):
+                yield row
+
+    def _parse_sample(self):
+        """ Parse the sample. Unless ``sampling`` is ``'head'`` and if
+        the file is longer than the window, the sample is drawn by
+        seeking in the source: to the rows picked with the row index if
+        there is one, otherwise to byte offsets picked in the rest of
+        the file, reading the record which starts after each. Without a
+        row index, a record with a quoted line break may be sampled from
+        its middle. """
+        if self.sampling == 'head' or len(self._sample) < self.window:
+            return list(self._parse(sample=True))
+        try:
+            source = self._indexable_source()
+        except TypeError:
+            return list(self._parse(sample=True))
+        if self.row_index is not None:
+            rownums = sample_rows(len(self), self.window, self.sample_head,
+                                  self.sampling)
+            return [self._read_records(n, n + 1)[0] for n in rownums]
+
+        params = self._reader_params
+        lines = []
+
+        def head_lines():
+            for line in self._sample:
+                lines.append(line)
+                yield line
+        rows = []
+        try:
+            reader = csv.reader(head_lines(), **params)
+            for row in islice(reader, min(self.sample_head, self.window)):
+                rows.append([c.decode('utf-8', 'ignore') for c in row])
+        except csv.Error:
+            pass
+        position = source.tell()
+        try:
+            # the byte offset after the lines of the head
+            source.seek(0)
+            start = sum(len(line) for line in
+                        islice(raw_lines(source, SAMPLE_READ_SIZE),
+                               len(lines)))
+            source.seek(0, os.SEEK_END)
+            size = source.tell()
+            seen = set()
+            for offset in sample_positions(start, size,
+                                           self.window - len(rows),
+                                           self.sampling):
+                if offset > start:
+                    # skip to the start of the next line
+                    source.seek(offset - 1)
+                    lines = raw_lines(source, SAMPLE_READ_SIZE)
+                    offset += len(next(lines)) - 1
+                else:
+                    source.seek(offset)
+                    lines = raw_lines(source, SAMPLE_READ_SIZE)
+                if offset >= size or offset in seen:
+                    continue
+                seen.add(offset)
+                try:
+                    row = next(csv.reader(split_lines(lines), **params), None)
+                except csv.Error:
+                    continue
+                if row is not None:
+                    rows.append([c.decode('utf-8', 'ignore') for c in row])
+        finally:
+            source.seek(position)
+        return rows
+
+    def _parse(self, sample=False, skip=0, limit=None, columns=None,
+               where=None):
         def rows():
             for line in self._sample:
                 yield line
@@ -157,10 +716,25 @@ class CSVRowSet(RowSet):
         # Fix the maximum field size to something a little larger
         csv.field_size_limit(256000)
 
+        decode = None
+        if self.dictionary_size:
+            decode = dictionary_decoder(self.dictionary_size)
+
         try:
-            for row in csv.reader(rows(),
-                    dialect=self._dialect, **self._overrides):
-                yield [Cell(to_unicode_or_bust(c)) for c in row]
+            reader = csv.reader(rows(),
+                dialect=self._dialect, **self._overrides)
+            for row in slice_rows(reader, skip, limit):
+                if where and not row_matches(where, partial(_field, row)):
+                    continue
+                if decode is not None:
+                    yield decode(row, columns)
+                    continue
+                if columns is None:
+                    yield [c.decode('utf-8', 'ignore') for c in row]
+                    continue
+                width = len(row)
+                yield [row[i].decode('utf-8', 'ignore') if i < width
+                       else None for i in columns]
         except csv.Error, err:
             if 'newline inside string' in unicode(err) and sample:
                 pass
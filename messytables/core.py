@@ -1,7 +1,14 @@
-from messytables.util import OrderedDict
+from messytables.util import OrderedDict, filter_processor
+from array import array
 from collections import Mapping
-from messytables.error import TableError, NoSuchPropertyError
+from itertools import islice, izip, izip_longest
+from messytables.error import (TableError, NoSuchPropertyError,
+                               NoSuchColumnError)
+from messytables.types import (StringType, CAST_FAILED, column_casters,
+                               types_processor)
 import cStringIO
+import inspect
+import random
 
 def seekable_stream(fileobj):
     try:
@@ -90,6 +97,105 @@ class BufferedFile(object):
             self.data.seek(offset)
 
 
+def slice_rows(rows, skip=0, limit=None):
+    """ Skip the first ``skip`` items of the iterable ``rows`` and stop
+    after ``limit`` more, if it is given. """
+    if not skip and limit is None:
+        return iter(rows)
+    return islice(rows, skip, None if limit is None else skip + limit)
+
+
+# The ways of drawing the sample of a row set (see ``RowSet.sampling``).
+SAMPLINGS = ('head', 'spread', 'random')
+
+def sample_positions(start, stop, count, sampling):
+    """ Pick ``count`` sorted positions from ``start`` up to ``stop``:
+    evenly spaced for the ``'spread'`` sampling, and uniformly at random
+    (with a fixed seed, so samples are repeatable) for ``'random'``. """
+    if sampling not in SAMPLINGS:
+        raise ValueError("Unknown sampling: %r" % (sampling,))
+    size = stop - start
+    if count <= 0:
+        return []
+    if count >= size:
+        return range(start, stop)
+    if sampling == 'random':
+        return sorted(random.Random(0).sample(xrange(start, stop), count))
+    step = float(size) / count
+    return [start + int(i * step) for i in xrange(count)]
+
+
+def sample_rows(count, window, head, sampling):
+    """ The numbers of the rows in the sample of a table of ``count``
+    rows: the first ``head`` rows, and the rest of the ``window`` picked
+    from the remaining rows according to ``sampling``. """
+    head = min(head, window, count)
+    return range(head) + sample_positions(head, count, window - head,
+                                          sampling)
+
+
+def project_row(row, columns, missing=None):
+    """ Pick the values at the indexes ``columns`` from ``row``, using
+    ``missing`` for the columns the row is too short to have. """
+    width = len(row)
+    return [row[i] if i < width else missing for i in columns]
+
+
+def row_matches(where, value):
+    """ Test a row against the ``where`` filters of ``RowSet.raw``.
+    ``value`` is called with a column index and returns the value of
+    that column in the row, or ``None`` if the row is too short. """
+    for columns, predicate in where:
+        if not predicate(*[value(i) for i in columns]):
+            return False
+    return True
+
+
+def _takes_pushdown(raw):
+    """ Check if a ``raw`` method accepts the ``skip``, ``limit``,
+    ``columns`` and ``where`` arguments. """
+    args, _, keywords, _ = inspect.getargspec(raw)
+    return keywords is not None or 'skip' in args
+
+
+def filter_rows(rows, where):
+    """ Leave out the rows (lists of values) which do not match
+    ``where`` (see ``row_matches``). """
+    if not where:
+        return rows
+    return (row for row in rows
+            if row_matches(where, lambda i: row[i] if i < len(row) else None))
+
+
+def pack_column(values):
+    """ Pack a column of floats into an ``array('d')`` and one of
+    integers into an ``array('l')``. Other columns, including those
+    with missing values, are returned as they are. """
+    kinds = set(map(type, values))
+    if kinds == set([float]):
+        return array('d', values)
+    if kinds and kinds <= set([int, long]):
+        try:
+            return array('l', values)
+        except OverflowError:
+            pass
+    return values
+
+
+def columns_from_rows(rows, pack=None):
+    """ Transpose a list of rows into a list of columns, padding short
+    rows with ``None``. Each column is a list, or what ``pack`` makes
+    of the list if it is given. """
+    width = max(len(row) for row in rows)
+    if any(len(row) != width for row in rows):
+        columns = [list(column) for column in izip_longest(*rows)]
+    else:
+        columns = [list(column) for column in izip(*rows)]
+    if pack is not None:
+        columns = [pack(column) for column in columns]
+    return columns
+
+
 class CoreProperties(Mapping):
     KEYS = []
 
@@ -106,21 +212,43 @@ class CoreProperties(Mapping):
         return len(self.KEYS)
 
 
+DEFAULT_TYPE = StringType()
+
+
 class Cell(object):
     """ A cell is the basic value type. It always has a ``value`` (that
     may be ``None`` and may optionally also have a type and column name
     associated with it. If no ``type`` is set, the String type is set
-    but no type conversion is set. """
+    but no type conversion is set.
+
+    Cells are created for every value read, so they are slotted and
+    share a single default type instance. Subclasses which need extra
+    attributes should declare their own ``__slots__``. """
+
+    __slots__ = ('value', 'column', 'column_autogenerated', 'type')
 
     def __init__(self, value, column=None, type=None):
         if type is None:
-            from messytables.types import StringType
-            type = StringType()
+            type = DEFAULT_TYPE
         self.value = value
         self.column = column
         self.column_autogenerated = False
         self.type = type
 
+    def __getstate__(self):
+        # Slotted objects have no __dict__, which pickle protocols 0
+        # and 1 need, so collect the slots of every class instead.
+        state = {}
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            setattr(self, name, value)
+
     def __repr__(self):
         if self.column is not None:
             return "<Cell(%r=%r:%r>" % (self.column,
@@ -157,6 +285,235 @@ class Cell(object):
         return True
 
 
+def compile_processors(processors):
+    """ Compile a chain of processors into a single function that is
+    called with the ``RowSet`` and a row, like a processor. Runs of
+    the built-in processors (which are marked with a ``builtin``
+    attribute) are fused, so that column names, null sets and casters
+    are prepared once and each row is walked only once for all of
+    them. Other processors are called as they are. """
+    stages = []
+    run = []
+    for processor in processors:
+        spec = getattr(processor, 'builtin', None)
+        if spec is None or spec[0] == 'filter':
+            if run:
+                stages.append(_fuse_builtins(run))
+                run = []
+            stages.append(processor)
+        else:
+            run.append(spec)
+    if run:
+        stages.append(_fuse_builtins(run))
+    return _chain(stages)
+
+
+def _chain(stages):
+    if not stages:
+        return lambda row_set, row: row
+    if len(stages) == 1:
+        return stages[0]
+
+    def apply_stages(row_set, row):
+        for stage in stages:
+            row = stage(row_set, row)
+            if row is None:
+                return None
+        return row
+    return apply_stages
+
+
+def _fuse_builtins(specs):
+    """ Turn a run of built-in processor specs into a single stage.
+    Consecutive null and type replacements share one loop over the
+    cells of the row. """
+    stages = []
+    cell_ops = []
+    for spec in specs:
+        kind = spec[0]
+        if kind in ('null', 'types'):
+            cell_ops.append(spec)
+            continue
+        if cell_ops:
+            stages.append(_cells_stage(cell_ops))
+            cell_ops = []
+        if kind == 'headers':
+            stages.append(_headers_stage(spec[1], spec[2]))
+        elif kind == 'offset':
+            stages.append(_offset_stage(spec[1]))
+    if cell_ops:
+        stages.append(_cells_stage(cell_ops))
+    return _chain(stages)
+
+
+def _offset_stage(offset):
+    def apply_offset(row_set, row):
+        if not hasattr(row_set, '_offset'):
+            row_set._offset = 0
+        if row_set._offset >= offset:
+            return row
+        row_set._offset += 1
+    return apply_offset
+
+
+def _headers_stage(headers, columns=None):
+    headers = list(headers)
+    width = len(headers)
+    names = []
+    for i, header in enumerate(headers):
+        if columns is not None and i < len(columns):
+            i = columns[i]
+        names.append((header, False) if header else
+                     ("column_%d" % i, True))
+
+    def apply_headers(row_set, row):
+        if len(row) < width:
+            row = row + [Cell(None) for _ in xrange(width - len(row))]
+        while len(names) < len(row):
+            names.append(("column_%d" % len(names), True))
+        for cell, (name, autogenerated) in izip(row, names):
+            cell.column = name
+            if autogenerated:
+                cell.column_autogenerated = True
+        return row
+    return apply_headers
+
+
+def _null_set(nulls):
+    try:
+        return frozenset(nulls)
+    except TypeError:
+        return nulls
+
+
+def _cells_stage(ops):
+    ops = [op for op in ops if op[0] != 'types' or op[1] is not None]
+    kinds = [op[0] for op in ops]
+    if kinds == ['null']:
+        nulls = _null_set(ops[0][1])
+
+        def apply_nulls(row_set, row):
+            for cell in row:
+                if cell.value in nulls:
+                    cell.value = None
+            return row
+        return apply_nulls
+
+    if kinds == ['types']:
+        _, types, strict, rejects, numeric, memo_size, number_format = ops[0]
+        casters = column_casters(types, numeric or 'decimal', memo_size,
+                                 number_format)
+
+        def apply_types(row_set, row):
+            if rejects is not None:
+                n = rejects.rows_seen
+                rejects.rows_seen += 1
+            for i, (cell, (type, cast)) in enumerate(izip(row, casters)):
+                if cast is None:
+                    continue
+                value = cast(cell.value)
+                if value is CAST_FAILED:
+                    if rejects is not None:
+                        rejects.add(n, i, cell.value)
+                    elif strict:
+                        type.cast(cell.value)
+                    continue
+                cell.value = value
+                cell.type = type
+            return row
+        return apply_types
+
+    if kinds == ['null', 'types']:
+        nulls = _null_set(ops[0][1])
+        _, types, strict, rejects, numeric, memo_size, number_format = ops[1]
+        casters = column_casters(types, numeric or 'decimal', memo_size,
+                                 number_format)
+        width = len(casters)
+
+        def apply_nulls_types(row_set, row):
+            if rejects is not None:
+                n = rejects.rows_seen
+                rejects.rows_seen += 1
+            for i, cell in enumerate(row):
+                value = cell.value
+                if value in nulls:
+                    value = cell.value = None
+                if i < width:
+                    type, cast = casters[i]
+                    if cast is None:
+                        continue
+                    result = cast(value)
+                    if result is CAST_FAILED:
+                        if rejects is not None:
+                            rejects.add(n, i, value)
+                        elif strict:
+                            type.cast(value)
+                        continue
+                    cell.value = result
+                    cell.type = type
+            return row
+        return apply_nulls_types
+
+    # any other combination: apply the operations one after another
+    return _chain([_cells_stage([op]) for op in ops])
+
+
+def _pad_columns(spec):
+    width = len(spec[1])
+
+    def pad_columns(columns, length):
+        while len(columns) < width:
+            columns.append([None] * length)
+    return pad_columns
+
+
+def _replace_nulls(spec):
+    nulls = _null_set(spec[1])
+
+    def replace_nulls(columns, length):
+        for i, values in enumerate(columns):
+            columns[i] = [None if value in nulls else value
+                          for value in values]
+    return replace_nulls
+
+
+def _cast_columns(spec):
+    _, types, strict, rejects, numeric, memo_size, number_format = spec
+    casters = column_casters(types or [], numeric or 'decimal', memo_size,
+                             number_format)
+
+    def cast_columns(columns, length):
+        first = 0
+        if rejects is not None:
+            first = rejects.rows_seen
+            rejects.rows_seen += length
+        for i, (values, (type, cast)) in enumerate(izip(columns, casters)):
+            if cast is None:
+                continue
+            result = map(cast, values)
+            if CAST_FAILED in result:
+                for n, value in enumerate(result):
+                    if value is not CAST_FAILED:
+                        continue
+                    if rejects is not None:
+                        rejects.add(first + n, i, values[n])
+                    elif strict:
+                        type.cast(values[n])
+                    result[n] = values[n]
+            columns[i] = result
+    return cast_columns
+
+
+# The built-in processors which ``RowSet.batches`` applies to the
+# columns of a batch, and how: each stage is called with the list of
+# columns and the number of rows, and changes the columns in place.
+COLUMN_STAGES = {
+    'headers': _pad_columns,
+    'null': _replace_nulls,
+    'types': _cast_columns,
+}
+
+
 class TableSet(object):
     """ A table set is used for data formats in which multiple tabular
     objects are bundled. This might include relational databases and
@@ -206,13 +563,45 @@ class RowSet(object):
     like type and header guessing on the data, a sample of ``window``
     rows is read, cached, and made available.
 
+    By default the sample is the first rows of the table. If
+    ``sampling`` is set to ``'spread'`` or ``'random'``, the CSV, XLS and
+    ODS row sets instead keep the first ``sample_head`` rows (for header
+    guessing and offsets) and draw the rest of the sample evenly spaced
+    or at random from the whole table, seeking to them rather than
+    reading everything in between.
+
+    Decimal numbers are cast to exact ``decimal.Decimal`` values by
+    default. Setting ``numeric`` to ``'float'`` makes the type
+    processors (and the ODS reader) produce floats instead, which are
+    much cheaper to create and compute with; ``'array'`` does the same
+    and has ``batches`` pack columns of numbers into arrays.
+
+    Setting ``dictionary_size`` turns on dictionary encoding for columns
+    with up to that many distinct values: the CSV reader returns one
+    shared object for each distinct value of a column, and the type
+    processors cast each distinct value once. Columns with more values
+    are read as usual.
+
+    Setting ``number_format`` to a ``NumberFormat`` makes the number
+    types of the type processors which follow the locale read values
+    with that format instead; pass it on to ``type_guess`` to guess
+    with it as well.
+
     On any fatal errors, it should raise messytables.ReadError
     """
 
+    sampling = 'head'
+    sample_head = 100
+    numeric = 'decimal'
+    dictionary_size = None
+    number_format = None
+
     def __init__(self, typed=False):
         self.typed = typed
         self._processors = []
         self._types = None
+        self._sample_cache = None
+        self._columns = None
 
     def set_types(self, types):
         self.typed = True
@@ -227,26 +616,209 @@ class RowSet(object):
         """ Register a stream processor to be used on each row. A
         processor is a function called with the ``RowSet`` as its
         first argument and the row to be processed as the second
-        argument. """
+        argument. If the processor has an ``on_values`` attribute, it
+        is used instead when rows are read as plain values (see
+        ``tuples``). """
         self._processors.append(processor)
 
+    def _split_offset(self):
+        """ Find an offset processor whose rows can be skipped by the
+        backend instead. This is the case if it is the only offset
+        processor and only processors which never drop or fail on a
+        row come before it. Returns the number of rows to skip and the
+        remaining processors. """
+        specs = [getattr(p, 'builtin', None) for p in self._processors]
+        offsets = [i for i, spec in enumerate(specs)
+                   if spec is not None and spec[0] == 'offset']
+        if len(offsets) != 1:
+            return 0, self._processors
+        i = offsets[0]
+        for spec in specs[:i]:
+            if spec is None or spec[0] == 'filter' or \
+                    (spec[0] == 'types' and (spec[2] or spec[3])):
+                return 0, self._processors
+        return specs[i][1], self._processors[:i] + self._processors[i + 1:]
+
+    def select(self, columns):
+        """ Only read the given ``columns``, in the given order, from
+        now on. Columns are given by index or by name; names refer to
+        the headers of the registered ``headers_processor``. Rows which
+        are too short to have a column get ``None`` in its place. Pass
+        ``None`` to read all columns again.
+
+        If all registered processors are built-in ones, the backend
+        reads only these columns and never creates cells or converts
+        values for the others. Otherwise, the columns are picked from
+        the processed rows. """
+        self._columns = None if columns is None else list(columns)
+
+    def _column_indexes(self, columns):
+        """ Turn a list of column indexes and names into indexes. """
+        headers = None
+        for processor in self._processors:
+            spec = getattr(processor, 'builtin', None)
+            if spec is not None and spec[0] == 'headers':
+                headers = list(spec[1])
+        indexes = []
+        for column in columns:
+            if not isinstance(column, (int, long)):
+                if headers is None or column not in headers:
+                    raise NoSuchColumnError("%r" % column)
+                column = headers.index(column)
+            indexes.append(column)
+        return indexes
+
+    def _split_filters(self, processors):
+        """ Resolve the columns of filter processors and take out the
+        filters which can be tested at the source: those preceded only
+        by header processors and other such filters. Returns the
+        ``where`` list of ``(columns, predicate)`` pairs for the backend
+        and the remaining processors. """
+        where = []
+        remaining = []
+        leading = True
+        for processor in processors:
+            spec = getattr(processor, 'builtin', None)
+            kind = spec[0] if spec is not None else None
+            if kind == 'filter':
+                columns = self._column_indexes(spec[1])
+                if leading:
+                    where.append((columns, spec[2]))
+                    continue
+                processor = filter_processor(spec[2], columns)
+            elif kind != 'headers':
+                leading = False
+            remaining.append(processor)
+        return where, remaining
+
+    def _with_settings(self, processors):
+        """ Make the type processors follow the ``numeric`` policy, the
+        ``dictionary_size`` and the ``number_format`` of the row set,
+        unless they have their own. """
+        numeric = self.numeric if self.numeric != 'decimal' else None
+        memo_size = self.dictionary_size
+        number_format = self.number_format
+        if numeric is None and not memo_size and number_format is None:
+            return processors
+        result = []
+        for processor in processors:
+            spec = getattr(processor, 'builtin', None)
+            if spec is not None and spec[0] == 'types' and \
+                    ((numeric and spec[4] is None) or
+                     (memo_size and spec[5] is None) or
+                     (number_format is not None and spec[6] is None)):
+                processor = types_processor(spec[1], spec[2], spec[3],
+                                            spec[4] or numeric,
+                                            spec[5] or memo_size,
+                                            spec[6] or number_format)
+            result.append(processor)
+        return result
+
+    def _clear_rejects(self, processors):
+        """ Clear the ``CastRejects`` of the type processors at the start
+        of a read, so that their row numbers count from its first row. """
+        for processor in processors:
+            spec = getattr(processor, 'builtin', None)
+            if spec is not None and spec[0] == 'types' and \
+                    spec[3] is not None:
+                spec[3].clear()
+
+    def _plan(self):
+        """ Work out how to read the rows: returns the number of rows
+        the backend can skip (see ``_split_offset``), the filters it
+        should test (see ``_split_filters``), the columns it should
+        read, the processors to apply to them and the columns to pick
+        from the processed rows. Processors carry a ``project``
+        attribute if they can be applied to a selection of columns. """
+        skip, processors = self._split_offset()
+        self._clear_rejects(processors)
+        processors = self._with_settings(processors)
+        where, processors = self._split_filters(processors)
+        if self._columns is None:
+            return skip, where, None, processors, None
+        columns = self._column_indexes(self._columns)
+        projected = [getattr(p, 'project', lambda columns: None)(columns)
+                     for p in processors]
+        if None in projected:
+            return skip, where, None, processors, columns
+        return skip, where, columns, projected, None
+
+    def raw(self, sample=False, skip=0, limit=None, columns=None,
+            where=None):
+        """ Iterate over the rows of the table as lists of ``Cell``
+        objects, leaving out the first ``skip`` rows and stopping
+        after ``limit`` rows if it is given. If ``columns`` is given,
+        only the cells at these indexes are read (see ``select``).
+        ``where`` is a list of ``(columns, predicate)`` pairs: rows in
+        the range are left out unless each predicate returns true for
+        the values at its columns (see ``filter_processor``).
+        Implemented by each backend. """
+        raise NotImplementedError("raw() not implemented on {0}"
+                                  .format(type(self)))
+
+    def _raw(self, sample=False, skip=0, limit=None, columns=None,
+             where=None):
+        """ Call ``raw`` with the row range, columns and filters. If
+        ``raw`` only takes ``sample``, as in subclasses written before
+        the other arguments were added, the rows it returns are sliced,
+        filtered and projected here instead. """
+        if _takes_pushdown(self.raw):
+            return self.raw(sample=sample, skip=skip, limit=limit,
+                            columns=columns, where=where)
+        rows = slice_rows(self.raw(sample=sample), skip, limit)
+        if where:
+            rows = (row for row in rows if row_matches(
+                where, lambda i: row[i].value if i < len(row) else None))
+        if columns is not None:
+            rows = ([cell if cell is not None else Cell(None)
+                     for cell in project_row(row, columns)] for row in rows)
+        return rows
+
     def __iter__(self, sample=False):
         """ Apply processors to the row data. """
-        for row in self.raw(sample=sample):
-            for processor in self._processors:
-                row = processor(self, row)
-                if row is None:
-                    break
+        skip, where, columns, processors, pick = self._plan()
+        process = compile_processors(processors)
+        for row in self._raw(sample=sample, skip=skip, columns=columns,
+                             where=where):
+            row = process(self, row)
             if row is not None:
+                if pick is not None:
+                    row = [cell if cell is not None else Cell(None)
+                           for cell in project_row(row, pick)]
                 yield row
 
         # this is a bit dirty but required for the offset processor:
         self._offset = 0
 
+    def raw_values(self, sample=False, skip=0, limit=None, columns=None,
+                   where=None):
+        """ Iterate over the rows as lists of plain values. Backends
+        override this to read the values straight from their parser
+        without creating ``Cell`` objects. """
+        for row in self._raw(sample=sample, skip=skip, limit=limit,
+                             columns=columns, where=where):
+            yield [cell.value for cell in row]
+
     @property
     def sample(self):
         return self.__iter__(sample=True)
 
+    def _sample_key(self):
+        """ The settings the parsed sample depends on. If they change,
+        the sample is parsed again. """
+        return (getattr(self, 'window', None), self.sampling,
+                self.sample_head)
+
+    def _cached_sample(self, parse):
+        """ Return the rows produced by ``parse()`` for the sample,
+        parsing only on first use or after the settings returned by
+        ``_sample_key`` have changed. Callers must copy rows before
+        handing them out, since they are shared between reads. """
+        key = self._sample_key()
+        if self._sample_cache is None or self._sample_cache[0] != key:
+            self._sample_cache = (key, list(parse()))
+        return self._sample_cache[1]
+
     def dicts(self, sample=False):
         """ Return a representation of the data as an iterator of
         ordered dictionaries. This is less specific than the cell
@@ -256,5 +828,80 @@ class RowSet(object):
         for row in generator:
             yield OrderedDict([(c.column, c.value) for c in row])
 
+    def tuples(self, sample=False):
+        """ Return a representation of the data as an iterator of
+        tuples of cell values. If all registered processors can work
+        on plain values (the built-in ones can), no ``Cell`` objects
+        are created at all. """
+        skip, where, columns, processors, pick = self._plan()
+        processors = [getattr(p, 'on_values', None) for p in processors]
+        if None in processors:
+            generator = self.sample if sample else self
+            for row in generator:
+                yield tuple([c.value for c in row])
+            return
+
+        for row in self.raw_values(sample=sample, skip=skip,
+                                   columns=columns, where=where):
+            for processor in processors:
+                row = processor(self, row)
+                if row is None:
+                    break
+            if row is not None:
+                if pick is not None:
+                    row = project_row(row, pick)
+                yield tuple(row)
+
+        self._offset = 0
+
+    def batches(self, size=1000, sample=False):
+        """ Return the data as an iterator of column-oriented batches.
+        Each batch holds up to ``size`` rows as a list of columns, and
+        each column is a list of values; short rows are padded with
+        ``None``.
+
+        If the registered processors are only headers, null and type
+        processors (and offsets and filters which the backend can apply
+        while reading), the plain values are read and the processors
+        are applied to each batch a column at a time: nulls are replaced
+        and each column is cast with a single caster. Otherwise, the
+        rows are read and processed as in ``tuples``. If no type
+        processor is registered, the columns are cast to ``types`` if
+        they are set, leaving the values which cannot be cast as they
+        are. With the ``'array'`` numeric policy, the columns of each
+        batch which hold only floats or only integers are packed by
+        ``pack_column``. """
+        skip, where, columns, processors, pick = self._plan()
+        specs = [getattr(p, 'builtin', None) for p in processors]
+        if pick is None and None not in specs and \
+                set(spec[0] for spec in specs) <= set(COLUMN_STAGES):
+            rows = self.raw_values(sample=sample, skip=skip,
+                                   columns=columns, where=where)
+        else:
+            rows = self.tuples(sample=sample)
+            specs = []
+        registered = [getattr(p, 'builtin', None) for p in self._processors]
+        if self._types is not None and \
+                'types' not in [spec[0] for spec in registered if spec]:
+            types = self._types
+            if columns is not None:
+                types = project_row(types, columns)
+            specs.append(('types', types, False, None, self.numeric,
+                          self.dictionary_size, self.number_format))
+        stages = [COLUMN_STAGES[spec[0]](spec) for spec in specs]
+        pack = pack_column if self.numeric == 'array' else None
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, size))
+            if not batch:
+                break
+            data = columns_from_rows(batch)
+            for stage in stages:
+                stage(data, len(batch))
+            if pack is not None:
+                data = [pack(column) for column in data]
+            yield data
+        self._offset = 0
+
     def __repr__(self):
         return "RowSet(%r)" % self.name
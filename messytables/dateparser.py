@@ -1,4 +1,11 @@
+import calendar
+import datetime
+from itertools import izip, product
+import locale
 import re
+import time
+
+from messytables.util import LRUCache
 
 date_regex = re.compile(r'''^\d{1,4}[-\/\.\s]\S+[-\/\.\s]\S+''')
 
@@ -64,3 +71,245 @@ def create_date_formats(day_first=True):
     return all_formats.values()
 
 DATE_FORMATS = create_date_formats()
+
+
+# The tokens each strptime directive can match: 'D' with the number of
+# digits, 'A' for letters and ' ' for whitespace. Formats with other
+# directives are not indexed by the detector.
+DIRECTIVE_TOKENS = {
+    'd': [(('D', 1),), (('D', 2),), ((' ',), ('D', 1))],
+    'm': [(('D', 1),), (('D', 2),)],
+    'H': [(('D', 1),), (('D', 2),)],
+    'M': [(('D', 1),), (('D', 2),)],
+    'S': [(('D', 1),), (('D', 2),)],
+    'Y': [(('D', 4),)],
+    'y': [(('D', 2),)],
+    'b': [(('A',),)],
+    'B': [(('A',),)],
+    'Z': [(('A',),)],
+}
+
+# strptime matches digits and whitespace in ASCII only.
+WHITESPACE = ' \t\n\r\f\v'
+
+
+def merge_tokens(tokens):
+    """ Join runs of digits, letters and whitespace into single tokens,
+    as they look in a value. """
+    merged = []
+    for token in tokens:
+        if merged and merged[-1][0] == token[0] and token[0] in 'DA ':
+            if token[0] == 'D':
+                merged[-1] = ('D', merged[-1][1] + token[1])
+            continue
+        merged.append(token)
+    return tuple(merged)
+
+
+class DateFormatDetector(object):
+    """ Finds the ``strptime`` formats which could parse a value without
+    trying them one after another. Each format is compiled into the
+    token sequences (runs of digits of a given length, letters,
+    whitespace and punctuation) it can match, and a value is tokenised
+    once and looked up. The formats returned still need to be
+    confirmed with ``strptime``, since the tokens do not check the
+    values of the fields. """
+
+    def __init__(self, formats):
+        self.index = {}
+        self.indexed = set()
+        self.punctuation = set()
+        for format in formats:
+            parts = self._format_parts(format)
+            if parts is None:
+                continue
+            self.indexed.add(format)
+            for tokens in product(*parts):
+                key = merge_tokens([t for part in tokens for t in part])
+                self.index.setdefault(key, set()).add(format)
+        self.indexed = frozenset(self.indexed)
+        self.index = dict((key, frozenset(formats))
+                          for key, formats in self.index.iteritems())
+
+    def _format_parts(self, format):
+        parts = []
+        chars = iter(format)
+        for char in chars:
+            if char == '%':
+                directive = next(chars, None)
+                if directive == '%':
+                    parts.append([(('%',),)])
+                elif directive in DIRECTIVE_TOKENS:
+                    parts.append(DIRECTIVE_TOKENS[directive])
+                else:
+                    return None
+            else:
+                parts.append([(self._char_token(char, True),)])
+        return parts
+
+    def _char_token(self, char, in_format=False):
+        if '0' <= char <= '9':
+            return ('D', 1)
+        if char in WHITESPACE:
+            return (' ',)
+        if char.isalpha() and ord(char) < 128:
+            return ('A',)
+        if in_format:
+            self.punctuation.add(char)
+        if char in self.punctuation:
+            return (char,)
+        return ('A',)
+
+    def tokenise(self, value):
+        """ The token sequence of ``value``. """
+        return merge_tokens([self._char_token(char) for char in value])
+
+    def detect(self, value):
+        """ Return the indexed formats which could parse ``value``. """
+        return self.index.get(self.tokenise(value), frozenset())
+
+
+DATE_DETECTOR = DateFormatDetector(DATE_FORMATS)
+
+
+def names_are_words():
+    """ Check that the month and time zone names of the current locale
+    are made of letters, as the detector assumes for ``%b``, ``%B``
+    and ``%Z``. """
+    names = list(calendar.month_name[1:]) + \
+        list(calendar.month_abbr[1:]) + list(time.tzname)
+    return all(name and all(c.isalpha() or c >= '\x80' for c in name)
+               for name in names)
+
+
+# The patterns strptime uses for the directives ``DateFormatParser``
+# handles itself, and the ``datetime`` fields they give.
+DIRECTIVE_PATTERNS = {
+    'd': r'(3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])',
+    'm': r'(1[0-2]|0[1-9]|[1-9])',
+    'Y': r'(\d\d\d\d)',
+    'y': r'(\d\d)',
+    'H': r'(2[0-3]|[0-1]\d|\d)',
+    'M': r'([0-5]\d|\d)',
+    'S': r'(6[0-1]|[0-5]\d|\d)',
+}
+DIRECTIVE_FIELDS = dict(Y=0, y=0, m=1, B=1, b=1, d=2, H=3, M=4, S=5)
+REGEX_CHARS = re.compile(r"([\\.^$*+?\(\){}\[\]|])")
+
+
+def names_pattern(names, capture=True):
+    """ The pattern strptime uses to match one of ``names``. Without
+    ``capture``, the pattern matches the name without a group. """
+    names = sorted(names, key=len, reverse=True)
+    return ('(%s)' if capture else '(?:%s)') % \
+        '|'.join(re.escape(n) for n in names)
+
+
+def two_digit_year(text):
+    """ Read a ``%y`` year the way strptime does. """
+    year = int(text)
+    return year + 2000 if year <= 68 else year + 1900
+
+
+class DateFormatParser(object):
+    """ Parses dates in a single ``strptime`` format. The format is
+    compiled once into the regular expression strptime would use, and
+    the ``datetime`` is built directly from the matched fields, without
+    the lock and the per-call cache lookups of ``strptime``. Results are
+    kept in a bounded LRU cache, since date columns tend to repeat
+    values. Formats with other directives than day, month (also by
+    name), year, hour, minute, second and time zone name, or without a
+    year, are parsed with ``strptime``. """
+
+    def __init__(self, format, cache_size=1024):
+        self.format = format
+        self.cache = LRUCache(cache_size)
+        self._compile()
+
+    def _current_settings(self):
+        """ The locale and time zone settings the compiled pattern
+        depends on. """
+        return (locale.getlocale(locale.LC_TIME), time.tzname, time.daylight)
+
+    def _compile(self):
+        self.regex = None
+        directives = re.findall('%(.)', self.format)
+        self._localised = bool(set(directives) & set('bBZ'))
+        self._settings = self._current_settings()
+        if len(set(directives)) != len(directives) or \
+                not set(directives) & set('Yy'):
+            return
+        months = [calendar.month_name[i].lower() for i in xrange(13)]
+        abbrs = [calendar.month_abbr[i].lower() for i in xrange(13)]
+        zones = ['utc', 'gmt', time.tzname[0].lower()]
+        if time.daylight:
+            zones.append(time.tzname[1].lower())
+        if self._localised and \
+                not all(ord(c) < 128 for n in months + abbrs + zones
+                        for c in n):
+            return
+        patterns = dict(DIRECTIVE_PATTERNS, B=names_pattern(months),
+                        b=names_pattern(abbrs),
+                        Z=names_pattern(zones, capture=False))
+        converters = dict(Y=int, y=two_digit_year, m=int, d=int, H=int,
+                          M=int, S=int,
+                          B=lambda text: months.index(text.lower()),
+                          b=lambda text: abbrs.index(text.lower()))
+        format = REGEX_CHARS.sub(r"\\\1", self.format)
+        format = re.sub(r'\s+', r'\\s+', format)
+        parts = format.split('%')
+        pattern = [parts[0]]
+        self._fields = []
+        for part in parts[1:]:
+            if not part or part[0] not in patterns:
+                return
+            pattern.append(patterns[part[0]] + part[1:])
+            if part[0] in converters:
+                self._fields.append((DIRECTIVE_FIELDS[part[0]],
+                                     converters[part[0]]))
+        self.regex = re.compile(''.join(pattern), re.IGNORECASE)
+
+    def _check_settings(self):
+        if self._localised and self._current_settings() != self._settings:
+            self._compile()
+
+    def matches(self, value):
+        """ Whether the string ``value`` has the shape of a date in the
+        format; ``parse`` may still fail for it with an invalid date. """
+        self._check_settings()
+        if self.regex is None:
+            return True
+        match = self.regex.match(value)
+        return match is not None and match.end() == len(value)
+
+    def parse(self, value):
+        """ Parse ``value`` like ``datetime.strptime(value, format)``. """
+        result = self.cache.get(value)
+        if result is None:
+            result = self._parse(value)
+            self.cache.set(value, result)
+        return result
+
+    def _parse(self, value):
+        self._check_settings()
+        if self.regex is None:
+            return datetime.datetime.strptime(value, self.format)
+        match = self.regex.match(value)
+        if match is None or match.end() != len(value):
+            raise ValueError("time data %r does not match format %r" %
+                             (value, self.format))
+        fields = [1900, 1, 1, 0, 0, 0]
+        for (index, convert), text in izip(self._fields, match.groups()):
+            fields[index] = convert(text)
+        return datetime.datetime(*fields)
+
+
+PARSERS = {}
+
+
+def date_format_parser(format):
+    """ The shared ``DateFormatParser`` for ``format``. """
+    parser = PARSERS.get(format)
+    if parser is None:
+        parser = PARSERS.setdefault(format, DateFormatParser(format))
+    return parser
@@ -14,3 +14,7 @@ class TableError(MessytablesError, LookupError):
 class NoSuchPropertyError(MessytablesError, KeyError):
     """The requested property doesn't exist"""
     pass
+
+class NoSuchColumnError(MessytablesError, KeyError):
+    """The requested column doesn't exist"""
+    pass
@@ -1,9 +1,13 @@
 import sys
 from datetime import datetime
+from functools import partial
+from itertools import izip
 import xlrd
 from xlrd.biffh import XLRDError
 
-from messytables.core import RowSet, TableSet, Cell, CoreProperties
+from messytables.core import (RowSet, TableSet, Cell, CoreProperties,
+                              project_row, row_matches, sample_rows,
+                              slice_rows)
 from messytables.types import (StringType, IntegerType,
                                DateType, FloatType)
 from messytables.error import ReadError
@@ -11,6 +15,15 @@ from messytables.error import ReadError
 class InvalidDateError(Exception):
     pass
 
+
+def xldate_to_datetime(value, datemode):
+    """ Convert an excel date number to a ``datetime``. """
+    if value == 0:
+        raise InvalidDateError
+    year, month, day, hour, minute, second = \
+        xlrd.xldate_as_tuple(value, datemode)
+    return datetime(year, month, day, hour, minute, second)
+
 XLS_TYPES = {
     1: StringType(),
     # NB: Excel does not distinguish floats from integers so we use floats
@@ -95,14 +108,54 @@ class XLSRowSet(RowSet):
         self.window = window or 1000
         super(XLSRowSet, self).__init__(typed=True)
 
-    def raw(self, sample=False):
+    def _row_numbers(self, sample=False, skip=0, limit=None, where=None):
+        num_rows = self.sheet.nrows
+        if sample and self.sampling != 'head':
+            rownums = sample_rows(num_rows, self.window, self.sample_head,
+                                  self.sampling)
+            rownums = slice_rows(rownums, skip, limit)
+        else:
+            if sample:
+                num_rows = min(self.window, num_rows)
+            if limit is not None:
+                num_rows = min(skip + limit, num_rows)
+            rownums = xrange(min(skip, num_rows), num_rows)
+        if not where:
+            return rownums
+        return (rownum for rownum in rownums
+                if row_matches(where, partial(self._value, rownum)))
+
+    def _value(self, rownum, colnum):
+        """ Read a single value the way ``raw_values`` does. """
+        if colnum >= self.sheet.row_len(rownum):
+            return None
+        value = self.sheet.cell_value(rownum, colnum)
+        if self.sheet.cell_type(rownum, colnum) == xlrd.XL_CELL_DATE:
+            try:
+                return xldate_to_datetime(value, self.sheet.book.datemode)
+            except InvalidDateError:
+                raise ValueError("Invalid date at '%s':%d,%d" % (
+                    self.sheet.name, colnum+1, rownum+1))
+        return value
+
+    def _cells(self, rownum, columns=None):
+        if columns is None:
+            return enumerate(self.sheet.row(rownum))
+        width = self.sheet.row_len(rownum)
+        return [(colnum, self.sheet.cell(rownum, colnum)
+                 if colnum < width else None) for colnum in columns]
+
+    def raw(self, sample=False, skip=0, limit=None, columns=None,
+            where=None):
         """ Iterate over all rows in this sheet. Types are automatically
         converted according to the excel data types specified, including
         conversion of excel dates, which are notoriously buggy. """
-        num_rows = self.sheet.nrows
-        for rownum in xrange(min(self.window, num_rows) if sample else num_rows):
+        for rownum in self._row_numbers(sample, skip, limit, where):
             row = []
-            for colnum, cell in enumerate(self.sheet.row(rownum)):
+            for colnum, cell in self._cells(rownum, columns):
+                if cell is None:
+                    row.append(Cell(None))
+                    continue
                 try:
                     row.append(XLSCell.from_xlrdcell(cell, self.sheet, colnum, rownum))
                 except InvalidDateError:
@@ -110,18 +163,39 @@ class XLSRowSet(RowSet):
                         self.sheet.name, colnum+1, rownum+1))
             yield row
 
+    def raw_values(self, sample=False, skip=0, limit=None, columns=None,
+                   where=None):
+        """ Iterate over all rows in this sheet as plain values. This
+        reads whole rows from xlrd rather than building a cell object
+        for each value. """
+        datemode = self.sheet.book.datemode
+        for rownum in self._row_numbers(sample, skip, limit, where):
+            row = self.sheet.row_values(rownum)
+            types = self.sheet.row_types(rownum)
+            if columns is None:
+                colnums = xrange(len(row))
+            else:
+                row = project_row(row, columns)
+                types = project_row(types, columns)
+                colnums = columns
+            for i, (colnum, ctype) in enumerate(izip(colnums, types)):
+                if ctype == xlrd.XL_CELL_DATE:
+                    try:
+                        row[i] = xldate_to_datetime(row[i], datemode)
+                    except InvalidDateError:
+                        raise ValueError("Invalid date at '%s':%d,%d" % (
+                            self.sheet.name, colnum+1, rownum+1))
+            yield row
+
 class XLSCell(Cell):
+    __slots__ = ('sheet', 'xlrd_cell', 'xlrd_pos')
+
     @staticmethod
     def from_xlrdcell(xlrd_cell, sheet, col, row):
         value = xlrd_cell.value
         cell_type = XLS_TYPES.get(xlrd_cell.ctype, StringType())
         if cell_type == DateType(None):
-            if value == 0:
-                raise InvalidDateError
-            year, month, day, hour, minute, second = \
-                xlrd.xldate_as_tuple(value, sheet.book.datemode)
-            value = datetime(year, month, day, hour,
-                             minute, second)
+            value = xldate_to_datetime(value, sheet.book.datemode)
         messy_cell = XLSCell(value, type=cell_type)
         messy_cell.sheet = sheet
         messy_cell.xlrd_cell = xlrd_cell
@@ -0,0 +1,386 @@
+import cStringIO
+from functools import partial
+from itertools import izip
+import re
+import sys
+import zipfile
+
+from lxml import etree
+import xlrd
+from xlrd.biffh import error_text_from_code
+
+from messytables.core import (RowSet, TableSet, Cell, project_row,
+                              row_matches, sample_rows, slice_rows)
+from messytables.excel import XLS_TYPES, InvalidDateError, xldate_to_datetime
+from messytables.error import ReadError
+from messytables.types import StringType
+
+
+SSML = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIPS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+R_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+ROW = SSML + 'row'
+DIMENSION = SSML + 'dimension'
+VALUE = SSML + 'v'
+INLINE_STRING = SSML + 'is'
+TEXT = SSML + 't'
+RUN = SSML + 'r'
+
+# The built-in number formats which show dates.
+DATE_FORMAT_IDS = frozenset(range(14, 23) + range(45, 48))
+# Parts of a number format which are shown as they are.
+FORMAT_LITERALS = re.compile(r'"[^"]*"|\\.|_.|\*.|\[[^\]]*\]')
+ESCAPED_CHAR = re.compile(r'_x([0-9A-Fa-f]{4})_')
+
+ERROR_CODES = dict((text, code) for code, text in
+                   error_text_from_code.iteritems())
+TRUE_VALUES = ('1', 'true', 'on')
+
+
+def is_date_format(code):
+    """ Guess if a number format code shows dates, like xlrd does: by
+    counting its date (``ymdhs``) and number (``0#?``) placeholders. """
+    code = FORMAT_LITERALS.sub('', code).lower()
+    dates = sum(code.count(c) for c in 'ymdhs')
+    numbers = sum(code.count(c) for c in '0#?')
+    return dates > numbers
+
+
+# The indexes of the column letters seen so far. Excel has at most three
+# letters per column (up to ``XFD``), so only these are kept, which bounds
+# the cache at 18,278 entries.
+COLUMN_INDEXES = {}
+MAX_COLUMN_LETTERS = 3
+
+
+def column_index(ref):
+    """ The index of the column of a cell reference like ``AB12``. """
+    letters = ref.rstrip('0123456789')
+    index = COLUMN_INDEXES.get(letters)
+    if index is None:
+        index = 0
+        for c in letters.upper():
+            if c != '$':
+                index = index * 26 + ord(c) - 64
+        index -= 1
+        if len(letters) <= MAX_COLUMN_LETTERS:
+            COLUMN_INDEXES[letters] = index
+    return index
+
+
+def sheet_width(ref):
+    """ The number of columns of a sheet whose used range is ``ref``, as
+    given by its ``<dimension>``, like ``A1:K20`` or ``A1``. """
+    if not ref:
+        return 0
+    return column_index(ref.split(':')[-1]) + 1
+
+
+def _cooked(elem):
+    """ The text of an element, with the escapes of OOXML strings
+    decoded and outer whitespace removed unless it is preserved. """
+    text = elem.text
+    if text is None:
+        return u''
+    if elem.get(XML_SPACE) != 'preserve':
+        text = text.strip('\t\n \r')
+    if '_x' in text:
+        text = ESCAPED_CHAR.sub(lambda m: unichr(int(m.group(1), 16)), text)
+    return unicode(text)
+
+
+def _string_text(elem):
+    """ The text of a shared or inline string, joining rich text runs. """
+    parts = []
+    for child in elem:
+        if child.tag == TEXT:
+            parts.append(_cooked(child))
+        elif child.tag == RUN:
+            parts.extend(_cooked(t) for t in child if t.tag == TEXT)
+    return u''.join(parts)
+
+
+def _clear(elem):
+    """ Free a parsed element and the siblings before it. """
+    elem.clear()
+    while elem.getprevious() is not None:
+        del elem.getparent()[0]
+
+
+def _value(values, i):
+    if i < len(values):
+        return values[i]
+
+
+class XLSXStreamTableSet(TableSet):
+    """ An Excel 2007+ (OOXML) workbook, read without loading it into
+    memory. Only the shared strings, the date formats and the list of
+    sheets are read up front; each sheet is parsed from the zip archive
+    as its rows are read.
+
+    A file-like object which is not seekable is read into memory first,
+    since zip archives need to be seeked. """
+
+    def __init__(self, fileobj=None, filename=None, window=None):
+        if not filename and not fileobj:
+            raise Exception('You must provide one of filename or fileobj')
+        self.window = window
+        if fileobj is not None and not self._seekable(fileobj):
+            fileobj = cStringIO.StringIO(fileobj.read())
+        try:
+            self.zipfile = zipfile.ZipFile(fileobj or filename)
+            self._names = dict((name.lower(), name)
+                               for name in self.zipfile.namelist())
+            self._read_workbook()
+            self.shared_strings = self._read_shared_strings()
+            self.date_styles = self._read_date_styles()
+        except (zipfile.BadZipfile, KeyError, etree.XMLSyntaxError):
+            _, value, traceback = sys.exc_info()
+            raise ReadError, "Can't read Excel file: %r" % value, traceback
+
+    @staticmethod
+    def _seekable(fileobj):
+        try:
+            fileobj.seek(0, 2)
+            fileobj.seek(0)
+            return True
+        except Exception:
+            return False
+
+    def open(self, path):
+        """ Open a part of the archive, matching its name regardless of
+        case like Excel does. """
+        return self.zipfile.open(self._names[path.lower()])
+
+    def _parse(self, path):
+        if path.lower() not in self._names:
+            return None
+        fh = self.open(path)
+        try:
+            return etree.parse(fh).getroot()
+        finally:
+            fh.close()
+
+    def _read_workbook(self):
+        """ Read the names and parts of the worksheets and the date
+        mode. """
+        targets = {}
+        rels = self._parse('xl/_rels/workbook.xml.rels')
+        for rel in rels.iter(RELATIONSHIPS + 'Relationship'):
+            if rel.get('Type', '').endswith('/worksheet'):
+                target = rel.get('Target').replace('\\', '/')
+                if target.startswith('/'):
+                    target = target[1:]
+                else:
+                    target = 'xl/' + target
+                targets[rel.get('Id')] = target
+        workbook = self._parse('xl/workbook.xml')
+        properties = workbook.find(SSML + 'workbookPr')
+        date1904 = None if properties is None else properties.get('date1904')
+        self.datemode = 1 if date1904 in TRUE_VALUES else 0
+        self.sheets = [(unicode(sheet.get('name')), targets[sheet.get(R_ID)])
+                       for sheet in workbook.iter(SSML + 'sheet')
+                       if sheet.get(R_ID) in targets]
+
+    def _read_shared_strings(self):
+        path = 'xl/sharedStrings.xml'
+        if path.lower() not in self._names:
+            return []
+        strings = []
+        fh = self.open(path)
+        try:
+            for _, elem in etree.iterparse(fh, tag=SSML + 'si'):
+                strings.append(_string_text(elem))
+                _clear(elem)
+        finally:
+            fh.close()
+        return strings
+
+    def _read_date_styles(self):
+        """ The indexes of the cell styles which show dates. """
+        styles = self._parse('xl/styles.xml')
+        if styles is None:
+            return frozenset()
+        date_formats = set(DATE_FORMAT_IDS)
+        for fmt in styles.iter(SSML + 'numFmt'):
+            number = int(fmt.get('numFmtId'))
+            if is_date_format(fmt.get('formatCode', '')):
+                date_formats.add(number)
+            else:
+                date_formats.discard(number)
+        cell_styles = styles.find(SSML + 'cellXfs')
+        if cell_styles is None:
+            return frozenset()
+        return frozenset(i for i, xf in enumerate(cell_styles.iter(SSML + 'xf'))
+                         if int(xf.get('numFmtId', 0)) in date_formats)
+
+    def make_tables(self):
+        """ Return the sheets in the workbook. """
+        return [XLSXStreamRowSet(name, self, path, self.window)
+                for name, path in self.sheets]
+
+
+class XLSXStreamRowSet(RowSet):
+    """ A single sheet of an Excel 2007+ workbook, parsed incrementally
+    with constant memory. Values are read as ``XLSRowSet`` reads them,
+    and rows are padded with empty cells to the width of the sheet given
+    by its ``<dimension>``, or to the widest row read so far if that is
+    wider. The width can differ from ``XLSRowSet``'s: the dimension may
+    count formatted empty cells, and merged cells do not widen the
+    sheet, as they are listed after the rows. Cell formatting is not
+    available. """
+
+    def __init__(self, name, table_set, path, window=None):
+        self.name = name
+        self.table_set = table_set
+        self.path = path
+        self.window = window or 1000
+        self._row_count = None
+        super(XLSXStreamRowSet, self).__init__(typed=True)
+
+    def raw(self, sample=False, skip=0, limit=None, columns=None,
+            where=None):
+        """ Iterate over the rows of the sheet. Cells get the types of
+        the Excel values, and dates are converted as by ``XLSRowSet``. """
+        for values, ctypes in self._rows(sample, skip, limit, where):
+            if columns is not None:
+                values = project_row(values, columns)
+                ctypes = project_row(ctypes, columns)
+            yield [Cell(value, type=XLS_TYPES.get(ctype, StringType()))
+                   if ctype is not None else Cell(None)
+                   for value, ctype in izip(values, ctypes)]
+
+    def raw_values(self, sample=False, skip=0, limit=None, columns=None,
+                   where=None):
+        """ Iterate over the rows of the sheet as plain values. """
+        for values, _ in self._rows(sample, skip, limit, where):
+            yield list(values) if columns is None else \
+                project_row(values, columns)
+
+    def _rows(self, sample=False, skip=0, limit=None, where=None):
+        if sample:
+            parse = partial(self._parse, limit=self.window)
+            if self.sampling != 'head':
+                parse = self._parse_sample
+            rows = slice_rows(self._cached_sample(parse), skip, limit)
+        else:
+            rows = self._parse(skip, limit)
+        if not where:
+            return rows
+        return (row for row in rows
+                if row_matches(where, partial(_value, row[0])))
+
+    def _parse_sample(self):
+        """ Parse only the rows picked for the sample by ``sampling``.
+        This takes a pass over the sheet to count its rows first. """
+        if self._row_count is None:
+            self._row_count = sum(1 for _ in self._parse())
+        rownums = sample_rows(self._row_count, self.window, self.sample_head,
+                              self.sampling)
+        return self._parse(rownums=frozenset(rownums))
+
+    def _parse(self, skip=0, limit=None, rownums=None):
+        """ Stream the rows of the sheet as pairs of lists of values and
+        of xlrd cell types, from row ``skip`` on and for ``limit`` rows
+        or only the rows numbered in ``rownums``. Rows without values
+        are only produced if a row with values follows them. Rows are
+        padded to the width of the sheet (see ``sheet_width``). """
+        stop = None if limit is None else skip + limit
+        if rownums is not None:
+            stop = max(rownums) + 1 if rownums else 0
+        rownum = -1
+        following = skip
+        width = 0
+        fh = self.table_set.open(self.path)
+        try:
+            for _, elem in etree.iterparse(fh, tag=(DIMENSION, ROW)):
+                if elem.tag == DIMENSION:
+                    width = sheet_width(elem.get('ref'))
+                    continue
+                number = elem.get('r')
+                rownum = int(number) - 1 if number else rownum + 1
+                if stop is not None and rownum >= stop:
+                    break
+                if rownum < skip or \
+                        (rownums is not None and rownum not in rownums):
+                    _clear(elem)
+                    continue
+                values, ctypes = self._parse_row(elem, rownum)
+                _clear(elem)
+                if not values:
+                    continue
+                width = max(width, len(values))
+                for empty in xrange(following, rownum):
+                    if rownums is None or empty in rownums:
+                        yield [u''] * width, [xlrd.XL_CELL_EMPTY] * width
+                following = rownum + 1
+                if len(values) < width:
+                    padding = width - len(values)
+                    values.extend([u''] * padding)
+                    ctypes.extend([xlrd.XL_CELL_EMPTY] * padding)
+                yield values, ctypes
+        finally:
+            fh.close()
+
+    def _parse_row(self, row, rownum):
+        """ Read the values of the cells of a row element, leaving out
+        cells without a value. """
+        values = []
+        ctypes = []
+        strings = self.table_set.shared_strings
+        date_styles = self.table_set.date_styles
+        colnum = -1
+        for cell in row:
+            ref = cell.get('r')
+            colnum = column_index(ref) if ref else colnum + 1
+            kind = cell.get('t', 'n')
+            text = None
+            for child in cell:
+                if child.tag == VALUE:
+                    text = child.text
+                elif child.tag == INLINE_STRING:
+                    text = _string_text(child)
+            if kind == 'n':
+                if not text:
+                    continue
+                value, ctype = float(text), xlrd.XL_CELL_NUMBER
+                if date_styles and int(cell.get('s', 0)) in date_styles:
+                    try:
+                        value = xldate_to_datetime(value,
+                                                   self.table_set.datemode)
+                    except InvalidDateError:
+                        raise ValueError("Invalid date at '%s':%d,%d" % (
+                            self.name, colnum + 1, rownum + 1))
+                    ctype = xlrd.XL_CELL_DATE
+            elif kind == 's':
+                if not text:
+                    continue
+                value, ctype = strings[int(text)], xlrd.XL_CELL_TEXT
+            elif kind == 'inlineStr':
+                if not text:
+                    continue
+                value, ctype = text, xlrd.XL_CELL_TEXT
+            elif kind == 'b':
+                value = None if not text else int(text in TRUE_VALUES)
+                ctype = xlrd.XL_CELL_BOOLEAN
+            elif kind == 'e':
+                value = ERROR_CODES.get(text or '#N/A')
+                ctype = xlrd.XL_CELL_ERROR
+            else:
+                value = None
+                for child in cell:
+                    if child.tag == VALUE:
+                        value = _cooked(child)
+                ctype = xlrd.XL_CELL_TEXT
+            if colnum >= len(values):
+                padding = colnum - len(values)
+                values.extend([u''] * padding)
+                ctypes.extend([xlrd.XL_CELL_EMPTY] * padding)
+                values.append(value)
+                ctypes.append(ctype)
+            else:
+                values[colnum] = value
+                ctypes[colnum] = ctype
+        return values, ctypes
@@ -1,7 +1,7 @@
 from collections import defaultdict
 from itertools import izip_longest
 
-from messytables.core import Cell
+from messytables.core import Cell, project_row
 
 
 def column_count_modal(rows):
@@ -38,9 +38,11 @@ def headers_guess(rows, tolerance=1):
     return 0, []
 
 
-def headers_processor(headers):
+def headers_processor(headers, columns=None):
     """ Add column names to the cells in a row_set. If no header is
-    defined, use an autogenerated name. """
+    defined, use an autogenerated name. ``columns`` are the indexes of
+    the columns in the source, if only some of them are read (see
+    ``RowSet.select``); autogenerated names are based on them. """
 
     def apply_headers(row_set, row):
         _row = []
@@ -50,10 +52,27 @@ def headers_processor(headers):
                 cell = Cell(None)
             cell.column = header
             if not cell.column:
+                if columns is not None and i < len(columns):
+                    i = columns[i]
                 cell.column = "column_%d" % i
                 cell.column_autogenerated = True
             _row.append(cell)
         return _row
+
+    def apply_headers_values(row_set, row):
+        missing = len(headers) - len(row)
+        if missing > 0:
+            row = row + [None] * missing
+        return row
+    apply_headers.on_values = apply_headers_values
+    apply_headers.builtin = ('headers', headers, columns)
+
+    def project(indexes):
+        names = project_row(headers, indexes)
+        if columns is not None:
+            indexes = project_row(columns, indexes)
+        return headers_processor(names, indexes)
+    apply_headers.project = project
     return apply_headers
 
 
@@ -1,4 +1,7 @@
-from messytables.core import RowSet, TableSet, Cell, CoreProperties
+from messytables.core import (RowSet, TableSet, Cell, CoreProperties,
+                              DEFAULT_TYPE, slice_rows, project_row,
+                              row_matches)
+from functools import partial
 import lxml.html
 from collections import defaultdict
 import html5lib
@@ -65,6 +68,26 @@ def insert_blank_cells(row, blanks):
     return row
 
 
+# Stands in for the cells covered by a row or column span.
+BLANK = object()
+
+
+def insert_blanks(elements, blanks):
+    """ Like ``insert_blank_cells``, but for a list of cell elements,
+    marking the blanks with ``BLANK``. """
+    elements = list(elements)
+    for i in blanks:
+        elements.insert(i, BLANK)
+    return elements
+
+
+def _text(elements, i):
+    """ The text of the cell at column ``i``, as ``raw_values`` reads it. """
+    if i < len(elements):
+        element = elements[i]
+        return "" if element is BLANK else text_from_element(element)
+
+
 class HTMLRowSet(RowSet):
     """
     A RowSet representing a HTML table.
@@ -84,7 +107,53 @@ class HTMLRowSet(RowSet):
         return [e for e in els
                 if self.sheet in e.xpath("./ancestor::table[1]")]
 
-    def raw(self, sample=False):
+    def raw(self, sample=False, skip=0, limit=None, columns=None,
+            where=None):
+        for elements, blanks in self._cached_rows(sample, skip, limit,
+                                                  where):
+            if columns is None:
+                html_cells = [HTMLCell(source=element)
+                              for element in elements]
+                yield insert_blank_cells(html_cells, blanks)
+                continue
+            yield [Cell(None) if element is None else
+                   FakeHTMLCell() if element is BLANK else
+                   HTMLCell(source=element)
+                   for element in project_row(
+                       insert_blanks(elements, blanks), columns)]
+
+    def raw_values(self, sample=False, skip=0, limit=None, columns=None,
+                   where=None):
+        for elements, blanks in self._cached_rows(sample, skip, limit,
+                                                  where):
+            if columns is None:
+                values = [text_from_element(element) for element in elements]
+                for i in blanks:
+                    values.insert(i, "")
+                yield values
+                continue
+            yield [None if element is None else
+                   "" if element is BLANK else
+                   text_from_element(element)
+                   for element in project_row(
+                       insert_blanks(elements, blanks), columns)]
+
+    def _cached_rows(self, sample=False, skip=0, limit=None, where=None):
+        if sample:
+            rows = self._cached_sample(lambda: self._rows(sample=True))
+        else:
+            rows = self._rows()
+        rows = slice_rows(rows, skip, limit)
+        if not where:
+            return rows
+        return ((elements, blanks) for elements, blanks in rows
+                if row_matches(where, partial(
+                    _text, insert_blanks(elements, blanks))))
+
+    def _rows(self, sample=False):
+        """ Yield the cell elements of each row together with the
+        columns at which blank cells must be inserted to account for
+        row and column spans. """
         def identify_anatomy(tag):
             # 0: thead, 1: tbody, 2: tfoot
             parts = ['.//ancestor::thead',
@@ -104,17 +173,17 @@ class HTMLRowSet(RowSet):
             # TODO: handle header nicer - preserve the fact it's a header!
             html_elements = self.in_table(
                 row.xpath('.//*[name()="td" or name()="th"]'))
-            html_cells = [HTMLCell(source=cell) for cell in html_elements]
 
             """ at the end of this chunk, you have accurate blank_cells."""
             output_column = 0
-            for html_cell in html_cells:
+            for html_element in html_elements:
                 assert type(r) == int
                 while output_column in blank_cells[r]:
                     output_column += 1  # pass over col, doesn't exist in src
 
-                rowspan = html_cell.properties['rowspan']
-                colspan = html_cell.properties['colspan']
+                properties = HTMLProperties(html_element)
+                rowspan = properties['rowspan']
+                colspan = properties['colspan']
 
                 x_range = range(output_column, output_column + colspan)
                 y_range = range(r, r + rowspan)
@@ -125,13 +194,15 @@ class HTMLRowSet(RowSet):
                             blank_cells[y].append(x)
                 output_column += 1
 
-            yield insert_blank_cells(html_cells, blank_cells[r])
+            yield html_elements, blank_cells[r]
             if sample and r == self.window:
                 return
             del blank_cells[r]
 
 
 class FakeHTMLCell(Cell):
+    __slots__ = ()
+
     def __init__(self):
         super(FakeHTMLCell, self).__init__("")
 
@@ -150,15 +221,19 @@ class HTMLCell(Cell):
     """ The Cell __init__ signature is:
     def __init__(self, value=None, column=None, type=None):
     where 'value' is the primary input, 'column' is a column name, and
-    type is messytables.types.StringType() or better."""
+    type is messytables.types.StringType() or better.
+
+    The value is the text of the element, until a processor sets it
+    (for example to the result of a cast)."""
+
+    __slots__ = ('_lxml', '_value')
 
     def __init__(self, value=None, column=None, type=None, source=None):
         assert value is None
         assert isinstance(source, lxml.etree._Element)
         self._lxml = source
         if type is None:
-            from messytables.types import StringType
-            type = StringType()
+            type = DEFAULT_TYPE
         self.type = type
         self.column = column
         self.column_autogenerated = False
@@ -175,7 +250,14 @@ class HTMLCell(Cell):
 
     @property
     def value(self):
-        return text_from_element(self._lxml)
+        try:
+            return self._value
+        except AttributeError:
+            return text_from_element(self._lxml)
+
+    @value.setter
+    def value(self, value):
+        self._value = value
 
     @property
     def properties(self):
@@ -1,10 +1,13 @@
 import cStringIO
+import decimal
+from functools import partial
 import re
 import zipfile
 
 from lxml import etree
 
-from messytables.core import RowSet, TableSet, Cell
+from messytables.core import (RowSet, TableSet, Cell, slice_rows,
+                              project_row, row_matches, sample_rows)
 from messytables.types import (StringType, DecimalType,
                                DateType)
 
@@ -12,12 +15,19 @@ from messytables.types import (StringType, DecimalType,
 ODS_TABLE_MATCH = re.compile(".*?(<table:table.*?<\/.*?:table>).*?", re.MULTILINE)
 ODS_TABLE_NAME = re.compile('.*?table:name=\"(.*?)\".*?')
 ODS_ROW_MATCH = re.compile(".*?(<table:table-row.*?<\/.*?:table-row>).*?", re.MULTILINE)
+# A table cell which is not self-closing and has a child element.
+ODS_CELL_CONTENT = re.compile("<table:table-cell(?:\s[^>]*[^/>])?>\s*<[^/]")
 
 ODS_TYPES = {
     'float': DecimalType(),
+    'percentage': DecimalType(),
+    'currency': DecimalType(),
     'date': DateType(None),
 }
 
+# The value types of cells which hold their number in ``office:value``.
+ODS_NUMBER_TYPES = frozenset(['float', 'percentage', 'currency'])
+
 NAMESPACES = {
     "dc": u"http://purl.org/dc/elements/1.1/",
     "draw": u"urn:oasis:names:tc:opendocument:xmlns:drawing:1.0",
@@ -36,6 +46,26 @@ ODS_HEADER = u"<wrapper {0}>"\
             for k,v in NAMESPACES.iteritems()))
 ODS_FOOTER = u"</wrapper>"
 
+TABLE_CELL = '{%s}table-cell' % NAMESPACES['table']
+OFFICE_VALUE_TYPE = '{%s}value-type' % NAMESPACES['office']
+OFFICE_VALUE = '{%s}value' % NAMESPACES['office']
+
+
+def _number(stored, cast):
+    """ The number stored in the ``office:value`` of a number cell, read
+    with ``cast``, or ``None`` if the value is missing or not a
+    number. """
+    try:
+        return cast(stored)
+    except (TypeError, ValueError, decimal.InvalidOperation):
+        return None
+
+
+def _text(row, i):
+    """ The text of cell ``i`` of a parsed row, if the row has it. """
+    if i < len(row):
+        return row[i][0]
+
 
 class ODSTableSet(TableSet):
     """
@@ -87,7 +117,13 @@ class ODSTableSet(TableSet):
 
 class ODSRowSet(RowSet):
     """ ODS support for a single sheet in the ODS workbook. Unlike
-    the CSV row set this is not a streaming operation. """
+    the CSV row set this is not a streaming operation.
+
+    Cells are read as their text, except that numbers (including
+    percentages and currency amounts) are read from their stored value,
+    as ``decimal.Decimal`` values or, unless the ``numeric`` policy is
+    ``'decimal'``, as floats. Number cells without a stored number keep
+    their text and are typed as strings. """
 
     def __init__(self, sheet, window=None):
         self.sheet = sheet
@@ -100,28 +136,90 @@ class ODSRowSet(RowSet):
         self.window = window or 1000
         super(ODSRowSet, self).__init__(typed=True)
 
-    def raw(self, sample=False):
+    def raw(self, sample=False, skip=0, limit=None, columns=None,
+            where=None):
         """ Iterate over all rows in this sheet. """
+        for row in self._rows(sample, skip, limit, columns, where):
+            yield [Cell(value, type=ODS_TYPES.get(cell_type, StringType()))
+                   for value, cell_type in row]
+
+    def raw_values(self, sample=False, skip=0, limit=None, columns=None,
+                   where=None):
+        """ Iterate over all rows in this sheet as plain values. """
+        for row in self._rows(sample, skip, limit, columns, where):
+            yield [value for value, _ in row]
+
+    def _rows(self, sample=False, skip=0, limit=None, columns=None,
+              where=None):
+        if sample:
+            parse = partial(self._parse, limit=self.window)
+            if self.sampling != 'head':
+                parse = self._parse_sample
+            rows = slice_rows(self._cached_sample(parse), skip, limit)
+        else:
+            rows = self._parse(skip, limit)
+        if where:
+            rows = (row for row in rows
+                    if row_matches(where, partial(_text, row)))
+        if columns is None:
+            return rows
+        return (project_row(row, columns, (None, None)) for row in rows)
+
+    def _parse(self, skip=0, limit=None):
+        """ Parse the rows of the sheet into lists of ``(text,
+        value-type)`` pairs. The first ``skip`` rows are only checked for
+        content, which ends the sheet, rather than parsed. """
         rows = ODS_ROW_MATCH.findall(self.sheet)
 
-        for row in rows:
-            row_data = []
-
-            block = "{0}{1}{2}".format(ODS_HEADER, row, ODS_FOOTER)
-            partial = cStringIO.StringIO(block)
-
-            for action, elem in etree.iterparse(partial, ('end',)):
-                if elem.tag == '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}table-cell':
-                    cell_type = elem.attrib.get('urn:oasis:names:tc:opendocument:xmlns:office:1.0:value-type')
-                    children = elem.getchildren()
-                    if children:
-                        c = Cell(children[0].text,
-                                 type=ODS_TYPES.get(cell_type, StringType()))
-                        row_data.append(c)
+        for row in rows[:skip]:
+            if not ODS_CELL_CONTENT.search(row):
+                raise StopIteration()
+        rows = rows[skip:] if limit is None else rows[skip:skip + limit]
 
+        for row in rows:
+            row_data = self._parse_row(row)
             if not row_data:
                 raise StopIteration()
-
-            del partial
             yield row_data
         del rows
+
+    def _parse_sample(self):
+        """ Parse only the rows picked for the sample by ``sampling``,
+        up to the first row without content, which ends the sheet. """
+        rows = ODS_ROW_MATCH.findall(self.sheet)
+        end = next((n for n, row in enumerate(rows)
+                    if not ODS_CELL_CONTENT.search(row)), len(rows))
+        for rownum in sample_rows(end, self.window, self.sample_head,
+                                  self.sampling):
+            row_data = self._parse_row(rows[rownum])
+            if not row_data:
+                break
+            yield row_data
+
+    def _sample_key(self):
+        return super(ODSRowSet, self)._sample_key() + (self.numeric,)
+
+    def _parse_row(self, row):
+        """ Parse the XML of a single row. """
+        row_data = []
+        cast = decimal.Decimal if self.numeric == 'decimal' else float
+
+        block = "{0}{1}{2}".format(ODS_HEADER, row, ODS_FOOTER)
+        buf = cStringIO.StringIO(block)
+
+        for action, elem in etree.iterparse(buf, ('end',)):
+            if elem.tag == TABLE_CELL:
+                cell_type = elem.attrib.get(OFFICE_VALUE_TYPE)
+                children = elem.getchildren()
+                if children:
+                    value = children[0].text
+                    if cell_type in ODS_NUMBER_TYPES:
+                        number = _number(elem.attrib.get(OFFICE_VALUE), cast)
+                        if number is None:
+                            cell_type = None
+                        else:
+                            value = number
+                    row_data.append((value, cell_type))
+
+        del buf
+        return row_data
@@ -1,6 +1,7 @@
-from messytables.core import RowSet, TableSet, Cell
-
-from messytables.types import StringType
+from messytables.core import (RowSet, TableSet, Cell, DEFAULT_TYPE,
+                              slice_rows, project_row, filter_rows,
+                              row_matches)
+from functools import partial
 
 try:
     from pdftables import get_tables
@@ -10,7 +11,15 @@ except ImportError as exc:
     get_tables = None
 
 
+def _content(row, i):
+    """ The value ``PDFCell`` gives the cell at column ``i``. """
+    if i < len(row):
+        pdf_cell = row[i]
+        return pdf_cell.content if pdf_cell.topleft else ""
+
+
 class PDFCell(Cell):
+    __slots__ = ('_cell', '_properties')
 
     def __init__(self, pdftables_cell):
 
@@ -30,7 +39,7 @@ class PDFCell(Cell):
 
         self.column = None
         self.column_autogenerated = False
-        self.type = StringType()
+        self.type = DEFAULT_TYPE
 
     @property
     def topleft(self):
@@ -84,14 +93,23 @@ class PDFRowSet(RowSet):
             page_number=table.page_number + 1,
         )
 
-    def raw(self, sample=False):
+    def raw(self, sample=False, skip=0, limit=None, columns=None,
+            where=None):
         """
         Yield one row of cells at a time
         """
         if hasattr(self.table, "cell_data"):
             # New style of cell data.
-            for row in self.table.cell_data:
-                yield [PDFCell(pdf_cell) for pdf_cell in row]
+            for row in slice_rows(self.table.cell_data, skip, limit):
+                if where and not row_matches(where, partial(_content, row)):
+                    continue
+                if columns is not None:
+                    row = project_row(row, columns)
+                yield [Cell(None) if pdf_cell is None else PDFCell(pdf_cell)
+                       for pdf_cell in row]
         else:
-            for row in self.table:
+            rows = filter_rows(slice_rows(self.table, skip, limit), where)
+            for row in rows:
+                if columns is not None:
+                    row = project_row(row, columns)
                 yield [Cell(pdf_cell) for pdf_cell in row]
@@ -1,13 +1,253 @@
+from array import array
 import decimal
+try:
+    from decimal import _dec_from_triple
+except ImportError:
+    _dec_from_triple = None
 import datetime
 from collections import defaultdict
-from itertools import izip_longest
+from itertools import islice, izip
 import locale
+import re
 import sys
 
 import dateutil.parser as parser
 
-from messytables.dateparser import DATE_FORMATS, is_date
+from messytables.util import ValueDictionary
+from messytables.dateparser import (DATE_FORMATS, DATE_DETECTOR, is_date,
+                                    date_format_parser, names_are_words)
+
+
+# Returned by the casters of ``CellType.caster`` for a value which
+# cannot be cast.
+CAST_FAILED = object()
+
+
+def _caster(cast, screen=None):
+    """ Wrap ``cast`` to return ``CAST_FAILED`` instead of raising.
+    Non-empty strings which ``screen`` rejects fail without calling
+    ``cast``, which saves raising and catching an exception. """
+    def cast_value(value):
+        if screen is not None and value and \
+                isinstance(value, basestring) and not screen(value):
+            return CAST_FAILED
+        try:
+            return cast(value)
+        except Exception:
+            return CAST_FAILED
+    return cast_value
+
+
+def number_pattern(sep, point=None):
+    """ Compile the pattern of an integer, or with a decimal ``point``
+    of a decimal number, whose digits may be grouped by ``sep``. The
+    groups are the sign, the whole digits, the fraction digits and the
+    exponent. """
+    digit = '[0-9%s]' % re.escape(sep) if sep else '[0-9]'
+    pattern = r'^\s*([-+]?)(%s*)' % digit
+    if point is not None:
+        pattern += r'(?:%s(%s*))?(?:[eE]([-+]?[0-9]+))?' % (
+            re.escape(point), digit)
+    return re.compile(pattern + r'\s*$', re.UNICODE)
+
+
+# Numbers in Python syntax, which are read before the locale's.
+PLAIN_INTEGER = number_pattern('')
+PLAIN_DECIMAL = number_pattern('', '.')
+
+# How decimal numbers are represented (see ``RowSet.numeric``): as exact
+# ``decimal.Decimal`` values, as floats, or as floats and integers which
+# ``RowSet.batches`` packs into arrays.
+NUMERIC_POLICIES = ('decimal', 'float', 'array')
+
+
+class NumberFormat(object):
+    """ Parses integers and decimal numbers written with the given
+    ``thousands_sep`` and ``decimal_point``, which default to those of
+    the locale active when the format is created. With ``parens``, a
+    number in parentheses is negative, as in accounts; with
+    ``percent``, a trailing percent sign divides a decimal number by a
+    hundred.
+
+    The patterns are compiled once and plain ASCII numbers are parsed in
+    a single match, building the ``Decimal`` from its digits rather than
+    through a float. Strings which cannot be numbers are rejected by a
+    lenient pattern without raising; the rest (like ``NaN`` or non-ASCII
+    digits) are cast by ``int`` and ``Decimal``. The parse methods
+    return ``CAST_FAILED`` for values they cannot read. """
+
+    def __init__(self, thousands_sep=None, decimal_point=None,
+                 parens=False, percent=False):
+        conv = locale.localeconv()
+        if thousands_sep is None:
+            thousands_sep = conv['thousands_sep']
+        if decimal_point is None:
+            decimal_point = conv['decimal_point']
+        self.thousands_sep = thousands_sep
+        self.decimal_point = decimal_point
+        self.parens = parens
+        self.percent = percent
+        self._compile()
+
+    def __reduce__(self):
+        return (NumberFormat, self._key())
+
+    def _key(self):
+        return (self.thousands_sep, self.decimal_point, self.parens,
+                self.percent)
+
+    def __eq__(self, other):
+        return isinstance(other, NumberFormat) and \
+            self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def _compile(self):
+        sep, point = self.thousands_sep, self.decimal_point
+        try:
+            sep, point = unicode(sep), unicode(point)
+        except UnicodeDecodeError:
+            # separators in the locale encoding: only the slow path
+            self._sep = self._point = None
+            self._integer = self._decimal = None
+            self._screen = re.compile('')
+            return
+        self._sep, self._point = sep, point
+        self._integer = number_pattern(sep)
+        self._decimal = number_pattern(sep, point)
+        screen = r'[\d\s+\-.eE%s]' % re.escape(sep + point)
+        self._screen = re.compile(r'^%s*\d%s*$' % (screen, screen),
+                                  re.UNICODE)
+
+    def _strip(self, value):
+        """ Remove the parentheses and percent sign the format allows,
+        returning the inner text, whether it is negative and the power
+        of ten to scale it by. """
+        negative, scale = False, 0
+        if self.parens or self.percent:
+            value = value.strip()
+            if self.parens and value[:1] == '(' and value[-1:] == ')':
+                value, negative = value[1:-1], True
+            if self.percent and value[-1:] == '%':
+                value, scale = value[:-1], -2
+        return value, negative, scale
+
+    def integer(self, value):
+        """ Parse an integer. """
+        if not isinstance(value, basestring):
+            return self._slow(int, value)
+        if value.isdigit():
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        negative = False
+        if self.parens or self.percent:
+            value, negative, scale = self._strip(value)
+            if scale:
+                return CAST_FAILED
+        match = PLAIN_INTEGER.match(value) or \
+            (self._integer and self._integer.match(value))
+        if not match:
+            if self._screen.match(value) is None:
+                return CAST_FAILED
+            return self._slow(int, value, negative)
+        sign, digits = match.groups()
+        if self._sep:
+            digits = digits.replace(self._sep, '')
+        if not digits:
+            return CAST_FAILED
+        number = int(sign + digits)
+        return -number if negative else number
+
+    def decimal(self, value):
+        """ Parse a decimal number. """
+        if not isinstance(value, basestring):
+            if isinstance(value, float) and sys.version_info < (2, 7):
+                value = str(value)
+            return self._slow(decimal.Decimal, value)
+        negative, scale = False, 0
+        if self.parens or self.percent:
+            value, negative, scale = self._strip(value)
+        match = PLAIN_DECIMAL.match(value) or \
+            (self._decimal and self._decimal.match(value))
+        if not match:
+            if self._screen.match(value) is None and \
+                    NUMBER_SPECIAL.match(value) is None:
+                return CAST_FAILED
+            number = self._slow(decimal.Decimal, value, negative)
+            if scale and number is not CAST_FAILED:
+                number = number.scaleb(scale)
+            return number
+        sign, whole, fraction, exponent = match.groups()
+        if fraction is None:
+            fraction = ''
+        elif self._sep:
+            fraction = fraction.replace(self._sep, '')
+        if self._sep:
+            whole = whole.replace(self._sep, '')
+        digits = str(whole + fraction).lstrip('0')
+        if not digits:
+            if not whole and not fraction:
+                return CAST_FAILED
+            digits = '0'
+        if exponent:
+            scale += int(exponent)
+        exponent = scale - len(fraction)
+        if sign == '-':
+            negative = not negative
+        if _dec_from_triple is None:
+            return decimal.Decimal('%s%se%d' % ('-' if negative else '',
+                                                digits, exponent))
+        return _dec_from_triple(int(negative), digits, exponent)
+
+    def floating(self, value):
+        """ Parse a decimal number into a float. Numbers which are
+        already floats are returned as they are. """
+        if not isinstance(value, basestring):
+            if type(value) is float:
+                return value
+            return self._slow(float, value)
+        negative, scale = False, 0
+        if self.parens or self.percent:
+            value, negative, scale = self._strip(value)
+        if PLAIN_DECIMAL.match(value) is None:
+            match = self._decimal and self._decimal.match(value)
+            if match:
+                sign, whole, fraction, exponent = match.groups()
+                if self._sep:
+                    whole = whole.replace(self._sep, '')
+                    fraction = (fraction or '').replace(self._sep, '')
+                value = '%s%s.%se%s' % (sign, whole, fraction or '',
+                                        exponent or '0')
+            elif self._screen.match(value) is None and \
+                    NUMBER_SPECIAL.match(value) is None:
+                return CAST_FAILED
+        number = self._slow(float, value, negative)
+        if scale and number is not CAST_FAILED:
+            number /= 10 ** -scale
+        return number
+
+    def _slow(self, cast, value, negative=False):
+        """ Cast a value which the patterns do not read, also without
+        thousands separators and with a ``.`` decimal point. """
+        try:
+            number = cast(value)
+        except Exception:
+            if not isinstance(value, basestring) or self._sep is None:
+                return CAST_FAILED
+            if self._sep:
+                value = value.replace(self._sep, '')
+            value = value.replace(self._point, '.')
+            try:
+                number = cast(value)
+            except Exception:
+                return CAST_FAILED
+        return -number if negative else number
 
 
 class CellType(object):
@@ -19,6 +259,8 @@ class CellType(object):
     guessing_weight = 1
     # the type that the result will have
     result_type = None
+    # whether ``test`` is true for any value
+    accepts_all = False
 
     def test(self, value):
         """ Test if the value is of the given type. The
@@ -32,6 +274,20 @@ class CellType(object):
         except:
             return False
 
+    def fits(self, shape):
+        """ Check if a string of the given ``TokenShape`` could be
+        of this type. If not, ``test`` would fail for it, so the
+        type guesser does not call it. """
+        return True
+
+    def caster(self, numeric='decimal'):
+        """ Return a function which casts a value like ``cast``, but
+        returns ``CAST_FAILED`` instead of raising an exception if the
+        value cannot be cast. Number types return floats rather than
+        ``Decimal`` values unless the ``numeric`` policy is
+        ``'decimal'`` (see ``NUMERIC_POLICIES``). """
+        return _caster(self.cast)
+
     @classmethod
     def instances(cls):
         return [cls()]
@@ -54,6 +310,7 @@ class CellType(object):
 class StringType(CellType):
     """ A string or other unconverted type. """
     result_type = basestring
+    accepts_all = True
 
     def cast(self, value):
         if value is None:
@@ -67,34 +324,77 @@ class StringType(CellType):
 
 
 class IntegerType(CellType):
-    """ An integer field. """
+    """ An integer field. Values are read with the ``NumberFormat``
+    given as ``number_format``, by default one for the current locale,
+    which the ``number_format`` of a type guess or row set replaces
+    (see ``with_number_format``). """
     guessing_weight = 6
     result_type = int
 
+    def __init__(self, number_format=None):
+        self.locale_format = number_format is None
+        self.number_format = number_format or NumberFormat()
+
     def cast(self, value):
-        if value in ('', None):
+        if not value and value in ('', None):
             return None
-        try:
-            return int(value)
-        except:
-            return locale.atoi(value)
+        number = self.number_format.integer(value)
+        if number is CAST_FAILED:
+            raise ValueError("Not an integer: %r" % (value,))
+        return number
+
+    def caster(self, numeric='decimal'):
+        integer = self.number_format.integer
+
+        def cast_value(value):
+            if not value and value in ('', None):
+                return None
+            return integer(value)
+        return cast_value
+
+    def fits(self, shape):
+        # shapes of another format say nothing, the value is cast
+        if shape.number_format != self.number_format:
+            return True
+        return shape.integer
 
 
 class DecimalType(CellType):
-    """ Decimal number, ``decimal.Decimal`` or float numbers. """
+    """ Decimal number, ``decimal.Decimal`` or float numbers. Values
+    are read with the ``NumberFormat`` given as ``number_format``, by
+    default one for the current locale, which the ``number_format`` of a
+    type guess or row set replaces (see ``with_number_format``). """
     guessing_weight = 4
     result_type = decimal.Decimal
 
+    def __init__(self, number_format=None):
+        self.locale_format = number_format is None
+        self.number_format = number_format or NumberFormat()
+
     def cast(self, value):
-        if value in ('', None):
+        if not value and value in ('', None):
             return None
-        try:
-            return decimal.Decimal(value)
-        except:
-            value = locale.atof(value)
-            if sys.version_info < (2, 7):
-                value = str(value)
-            return decimal.Decimal(value)
+        number = self.number_format.decimal(value)
+        if number is CAST_FAILED:
+            raise ValueError("Not a decimal number: %r" % (value,))
+        return number
+
+    def caster(self, numeric='decimal'):
+        if numeric == 'decimal':
+            parse = self.number_format.decimal
+        else:
+            parse = self.number_format.floating
+
+        def cast_value(value):
+            if not value and value in ('', None):
+                return None
+            return parse(value)
+        return cast_value
+
+    def fits(self, shape):
+        if shape.number_format != self.number_format:
+            return True
+        return shape.decimal
 
 
 class FloatType(DecimalType):
@@ -102,6 +402,16 @@ class FloatType(DecimalType):
     pass
 
 
+def with_number_format(type, number_format):
+    """ Return a number ``type`` which reads its values with the
+    locale's format as a type of the same class reading them with
+    ``number_format``. Other types, and number types created with a
+    format of their own, are returned as they are. """
+    if number_format is None or not getattr(type, 'locale_format', False):
+        return type
+    return type.__class__(number_format)
+
+
 class BoolType(CellType):
     """ A boolean field. Matches true/false, yes/no and 0/1 by default,
     but a custom set of values can be optionally provided.
@@ -117,6 +427,15 @@ class BoolType(CellType):
         if false_values is not None:
             self.false_values = false_values
 
+    def test(self, value):
+        if isinstance(value, self.result_type):
+            return True
+        if not isinstance(value, basestring):
+            return False
+        s = value.strip().lower()
+        return value == '' or s in self.true_values or \
+            s in self.false_values
+
     def cast(self, value):
         s = value.strip().lower()
         if value in ('', None):
@@ -127,6 +446,12 @@ class BoolType(CellType):
             return False
         raise ValueError
 
+    def caster(self, numeric='decimal'):
+        def screen(value):
+            s = value.strip().lower()
+            return s in self.true_values or s in self.false_values
+        return _caster(self.cast, screen)
+
 
 class DateType(CellType):
     """ The date type is special in that it also includes a specific
@@ -138,6 +463,7 @@ class DateType(CellType):
 
     def __init__(self, format):
         self.format = format
+        self._literals = format_literals(format)
 
     @classmethod
     def instances(cls):
@@ -148,6 +474,14 @@ class DateType(CellType):
             return False
         return CellType.test(self, value)
 
+    def fits(self, shape):
+        if not shape.date:
+            return False
+        if shape.date_formats is not None and \
+                self.format in DATE_DETECTOR.indexed:
+            return self.format in shape.date_formats
+        return self._literals <= shape.chars
+
     def cast(self, value):
         if isinstance(value, self.result_type):
             return value
@@ -155,7 +489,12 @@ class DateType(CellType):
             return None
         if self.format is None:
             return value
-        return datetime.datetime.strptime(value, self.format)
+        return date_format_parser(self.format).parse(value)
+
+    def caster(self, numeric='decimal'):
+        if self.format is None:
+            return _caster(self.cast)
+        return _caster(self.cast, date_format_parser(self.format).matches)
 
     def __eq__(self, other):
         return (isinstance(other, DateType) and
@@ -187,84 +526,466 @@ class DateUtilType(CellType):
 TYPES = [StringType, DecimalType, IntegerType, DateType, BoolType]
 
 
-def type_guess(rows, types=TYPES, strict=False):
+def format_literals(format):
+    """ The characters a value must contain to match the ``strptime``
+    format ``format``, in lower case since matching ignores case. A
+    space stands for any whitespace. """
+    literals = set()
+    if format is None:
+        return frozenset()
+    directive = False
+    for char in format:
+        if directive:
+            if char == '%':
+                literals.add(char)
+            directive = False
+        elif char == '%':
+            directive = True
+        elif char.isspace():
+            literals.add(' ')
+        else:
+            literals.add(char.lower())
+    return frozenset(literals)
+
+
+class TokenShape(object):
+    """ The lexical classes a string value belongs to, as found by
+    ``TokenClassifier``, and the characters it contains. For dates,
+    ``date_formats`` holds the formats of ``DATE_DETECTOR`` which could
+    parse the value, if the detector could be used. The number classes
+    hold for the ``NumberFormat`` given as ``number_format``. """
+    __slots__ = ('integer', 'decimal', 'date', 'chars', 'date_formats',
+                 'number_format')
+
+    def __init__(self, integer, decimal, date, chars, date_formats=None,
+                 number_format=None):
+        self.integer = integer
+        self.decimal = decimal
+        self.date = date
+        self.chars = chars
+        self.date_formats = date_formats
+        self.number_format = number_format
+
+
+NUMBER_SPECIAL = re.compile(r'^\s*[-+]?(inf(inity)?|s?nan\d*)\s*$',
+                            re.IGNORECASE | re.UNICODE)
+WHITESPACE = re.compile(r'\s', re.UNICODE)
+
+
+class TokenClassifier(object):
+    """ Sorts string values into lexical classes (integer, decimal and
+    date-shaped tokens) with precompiled patterns, so that the type
+    guesser only needs to cast a value to confirm a type which it
+    could be. The patterns are a little more lenient than the casts,
+    and allow for the separators, parentheses and percent sign of the
+    ``NumberFormat`` given as ``number_format``, by default one for the
+    locale which is active when the classifier is created. Date-shaped
+    values are also matched against the formats of ``DATE_DETECTOR``. """
+
+    def __init__(self, number_format=None):
+        self.number_format = number_format = number_format or NumberFormat()
+        sep, point = number_format.thousands_sep, number_format.decimal_point
+        try:
+            sep, point = unicode(sep), unicode(point)
+            sep.encode('ascii'), point.encode('ascii')
+        except (UnicodeDecodeError, UnicodeEncodeError):
+            # the format is not handled, values are tested by casting
+            self.classify = lambda value: None
+            return
+        self.sep = sep
+        self._detect = DATE_DETECTOR.detect if names_are_words() else None
+        signs = '()' if number_format.parens else ''
+        integer = r'[\d\s+\-%s]' % re.escape(sep + signs)
+        if number_format.percent:
+            signs += '%'
+        number = r'[\d\s+\-.eE%s]' % re.escape(sep + point + signs)
+        self._integer = re.compile(r'^%s*\d%s*$' % (integer, integer),
+                                   re.UNICODE)
+        self._decimal = re.compile(r'^%s*\d%s*$' % (number, number),
+                                   re.UNICODE)
+
+    def decimal(self, value):
+        """ Whether the string ``value`` could be a decimal number. """
+        return self._integer.match(value) is not None or \
+            self._decimal.match(value) is not None or \
+            NUMBER_SPECIAL.match(value.replace(self.sep, '')
+                                 if self.sep else value) is not None
+
+    def classify(self, value):
+        """ Return the ``TokenShape`` of the string ``value``. """
+        integer = self._integer.match(value) is not None
+        decimal = integer or self.decimal(value)
+        date = is_date(value) is not None
+        chars = frozenset(value.lower())
+        date_formats = None
+        if date:
+            if WHITESPACE.search(value):
+                chars = chars | frozenset(' ')
+            if self._detect is not None:
+                date_formats = self._detect(value)
+        return TokenShape(integer, decimal, date, chars, date_formats,
+                          self.number_format)
+
+
+def value_counts(rows, settled=()):
+    """ Count how often each non-empty value occurs in each column of
+    ``rows``. Returns a list with one dict per column, mapping the
+    class and value of each distinct value to its count. The values of
+    the column indexes in ``settled`` are not counted. """
+    columns = []
+    if settled:
+        live = []
+        for row in rows:
+            for index in xrange(len(columns), len(row)):
+                columns.append(defaultdict(int))
+                if index not in settled:
+                    live.append(index)
+            for index in live:
+                if index >= len(row):
+                    break
+                value = row[index].value
+                if value:
+                    columns[index][(value.__class__, value)] += 1
+        return columns
+    for row in rows:
+        for _ in xrange(len(row) - len(columns)):
+            columns.append(defaultdict(int))
+        for counts, cell in izip(columns, row):
+            value = cell.value
+            if value:
+                counts[(value.__class__, value)] += 1
+    return columns
+
+
+# the number of rows between checks for settled columns
+SETTLE_BLOCK_SIZE = 200
+
+
+class TypeGuesser(object):
+    """ Guesses column types like ``type_guess``, but can be fed rows
+    incrementally with ``update`` and combined with the guessers of
+    other shards or processes with ``merge``; ``result`` returns the
+    types ``type_guess`` would for all rows seen so far.
+
+    For each column, the guesser only counts the non-empty values and
+    how many of them each type could cast, so it stays small however
+    many rows it sees, and can be pickled to be sent between
+    processes. Number types which follow the locale read values with
+    ``number_format`` instead, if it is given. """
+
+    def __init__(self, types=TYPES, strict=False, number_format=None):
+        self.types = [with_number_format(i, number_format)
+                      for t in types for i in t.instances()]
+        self.strict = strict
+        self.number_format = number_format
+        self.totals = []
+        self.passes = []
+        self._reset_cache()
+
+    def _reset_cache(self):
+        self._classify = TokenClassifier(self.number_format).classify
+        self._fitting = {}
+
+    def __getstate__(self):
+        return dict((k, v) for k, v in self.__dict__.iteritems()
+                    if k not in ('_classify', '_fitting'))
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_cache()
+
+    def _add_columns(self, count):
+        for _ in xrange(count - len(self.totals)):
+            self.totals.append(0)
+            self.passes.append([0] * len(self.types))
+
+    def _candidates(self, value):
+        """ The indexes of the types which could cast ``value``. """
+        everything = xrange(len(self.types))
+        if not isinstance(value, basestring):
+            return everything
+        shape = self._classify(value)
+        if shape is None:
+            return everything
+        # many values share a shape, so the fitting types are cached
+        key = (shape.integer, shape.decimal, shape.date, shape.chars,
+               shape.date_formats)
+        if key not in self._fitting:
+            self._fitting[key] = [i for i, t in enumerate(self.types)
+                                  if t.fits(shape)]
+        return self._fitting[key]
+
+    def update(self, rows, until_settled=False):
+        """ Count the values of ``rows``. Each distinct value in a
+        column is only tested once against each type, and counted as
+        often as it occurs. Strings are only tested against the types
+        their shape fits (see ``TokenClassifier``).
+
+        In strict mode, the rows are read in blocks, and the values of
+        columns which are already decided (see ``settled_columns``) are
+        no longer counted. With ``until_settled``, no more rows are
+        read once all columns are decided, so ``rows`` can be a whole
+        row set instead of a sample. """
+        if not self.strict:
+            self._count(value_counts(rows))
+            return self
+        rows = iter(rows)
+        while True:
+            block = list(islice(rows, SETTLE_BLOCK_SIZE))
+            if not block:
+                break
+            self._count(value_counts(block, self.settled_columns()))
+            if until_settled and self.settled:
+                break
+        return self
+
+    def _count(self, columns):
+        self._add_columns(len(columns))
+        types = self.types
+        for index, counts in enumerate(columns):
+            passes = self.passes[index]
+            for (_, value), count in counts.iteritems():
+                total = self.totals[index]
+                for i in self._candidates(value):
+                    # in strict mode, a type which failed once is out
+                    if self.strict and passes[i] != total:
+                        continue
+                    if types[i].test(value):
+                        passes[i] += count
+                self.totals[index] += count
+
+    def settled_columns(self):
+        """ The indexes of the columns whose strict guess can no longer
+        change: they have values, and all the types still possible
+        accept any value (like ``StringType``). """
+        if not self.strict:
+            return set()
+        return set(index for index, (total, passes) in
+                   enumerate(izip(self.totals, self.passes))
+                   if total and all(t.accepts_all for t, n in
+                                    izip(self.types, passes)
+                                    if n == total))
+
+    @property
+    def settled(self):
+        """ Whether the strict guess of every column is decided. """
+        return bool(self.totals) and \
+            len(self.settled_columns()) == len(self.totals)
+
+    def merge(self, other):
+        """ Add the counts of the guesser ``other``, which must guess
+        the same types in the same mode. """
+        if other.types != self.types or other.strict != self.strict or \
+                other.number_format != self.number_format:
+            raise ValueError("Cannot merge guessers of different types")
+        self._add_columns(len(other.totals))
+        for index, (total, passes) in enumerate(izip(other.totals,
+                                                     other.passes)):
+            self.totals[index] += total
+            self.passes[index] = [a + b for a, b in
+                                  izip(self.passes[index], passes)]
+        return self
+
+    def result(self):
+        """ The most probable type for each column, as a list of
+        ``CellType``. """
+        _columns = []
+        for total, passes in izip(self.totals, self.passes):
+            if self.strict:
+                # in case there were no values at all in the column,
+                # we just set the guessed type to string
+                if not total:
+                    guess = {StringType(): 0}
+                else:
+                    # no need to set guessing weights before this
+                    # because we only accept a type if it never fails
+                    guess = dict((t, t.guessing_weight) for t, n in
+                                 izip(self.types, passes) if n == total)
+            else:
+                # add string guess so that we have at least one guess
+                guess = defaultdict(int)
+                guess[StringType()] = 0
+                for type, n in izip(self.types, passes):
+                    if n:
+                        guess[type] += type.guessing_weight * n
+            # this first creates an array of tuples because we want the
+            # types to be sorted. Even though it is not specified, python
+            # chooses the first element in case of a tie
+            # See: http://stackoverflow.com/a/6783101/214950
+            guesses_tuples = [(t, guess[t]) for t in self.types
+                              if t in guess]
+            _columns.append(max(guesses_tuples, key=lambda (t, n): n)[0])
+        return _columns
+
+
+def type_guess(rows, types=TYPES, strict=False, number_format=None):
     """ The type guesser aggregates the number of successful
     conversions of each column to each type, weights them by a
     fixed type priority and select the most probable type for
     each column based on that figure. It returns a list of
     ``CellType``. Empty cells are ignored.
 
+    Each distinct value in a column is only tested once against
+    each type, and counted as often as it occurs. Strings are only
+    tested against the types their shape fits (see
+    ``TokenClassifier``). To guess types over several chunks or
+    shards of a table, use ``TypeGuesser``.
+
     Strict means that a type will not be guessed
-    if parsing fails for a single cell in the column."""
-    guesses = []
-    type_instances = [i for t in types for i in t.instances()]
-    if strict:
-        at_least_one_value = []
-        for ri, row in enumerate(rows):
-            diff = len(row) - len(guesses)
-            for _ in xrange(diff):
-                typesdict = {}
-                for type in type_instances:
-                    typesdict[type] = 0
-                guesses.append(typesdict)
-                at_least_one_value.append(False)
-            for ci, cell in enumerate(row):
-                if not cell.value:
-                    continue
-                at_least_one_value[ci] = True
-                for type in guesses[ci].keys():
-                    if not type.test(cell.value):
-                        guesses[ci].pop(type)
-        # no need to set guessing weights before this
-        # because we only accept a type if it never fails
-        for i, guess in enumerate(guesses):
-            for type in guess:
-                guesses[i][type] = type.guessing_weight
-        # in case there were no values at all in the column,
-        # we just set the guessed type to string
-        for i, v in enumerate(at_least_one_value):
-            if not v:
-                guesses[i] = {StringType(): 0}
-    else:
-        for i, row in enumerate(rows):
-            diff = len(row) - len(guesses)
-            for _ in xrange(diff):
-                guesses.append(defaultdict(int))
-            for i, cell in enumerate(row):
-                # add string guess so that we have at least one guess
-                guesses[i][StringType()] = guesses[i].get(StringType(), 0)
-                if not cell.value:
-                    continue
-                for type in type_instances:
-                    if type.test(cell.value):
-                        guesses[i][type] += type.guessing_weight
-        _columns = []
-    _columns = []
-    for guess in guesses:
-        # this first creates an array of tuples because we want the types to be
-        # sorted. Even though it is not specified, python chooses the first
-        # element in case of a tie
-        # See: http://stackoverflow.com/a/6783101/214950
-        guesses_tuples = [(t, guess[t]) for t in type_instances if t in guess]
-        _columns.append(max(guesses_tuples, key=lambda (t, n): n)[0])
-    return _columns
-
-
-def types_processor(types, strict=False):
+    if parsing fails for a single cell in the column.
+
+    Numbers are read with the ``NumberFormat`` given as
+    ``number_format``, such as the ``number_format`` of the row set
+    the rows come from, rather than with the locale's."""
+    return TypeGuesser(types, strict, number_format).update(rows).result()
+
+
+class CastRejects(object):
+    """ Collects the cells which a ``types_processor`` could not cast,
+    as ``(row, column, value)`` triples of the row number, the column
+    index and the raw value. Each read of the row set (iterating it or
+    its sample, or ``tuples``) clears the collector when it starts, so
+    it holds the rejects of the last read. Rows are numbered from 0 in
+    the order in which the processor casts them during that read: if
+    no processor after it drops rows, this is the index of the row in
+    the rows the read produces. Row and column numbers are kept in
+    arrays. """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.rows_seen = 0
+        self.rows = array('L')
+        self.columns = array('L')
+        self.values = []
+
+    def add(self, row, column, value):
+        self.rows.append(row)
+        self.columns.append(column)
+        self.values.append(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return izip(self.rows, self.columns, self.values)
+
+    def column_counts(self):
+        """ The number of rejected cells for each column index. """
+        counts = defaultdict(int)
+        for column in self.columns:
+            counts[column] += 1
+        return dict(counts)
+
+    def __repr__(self):
+        return "<CastRejects(%d)>" % len(self)
+
+
+def _memoized(cast, size):
+    """ Remember the results of a caster for up to ``size`` distinct
+    string values (see ``ValueDictionary``). """
+    lookup = ValueDictionary(size, cast).lookup
+
+    def cast_value(value):
+        if isinstance(value, basestring):
+            return lookup(value)
+        return cast(value)
+    return cast_value
+
+
+def column_casters(types, numeric='decimal', memo_size=None,
+                   number_format=None):
+    """ Prepare ``(type, caster)`` pairs for a list of column types;
+    the caster is ``None`` for the columns without a type. Numbers are
+    represented according to the ``numeric`` policy, and read with
+    ``number_format`` if it is given (see ``with_number_format``). With
+    a ``memo_size``, each caster casts every distinct string value only
+    once, for up to that many values. """
+    if numeric not in NUMERIC_POLICIES:
+        raise ValueError("Unknown numeric policy: %r" % (numeric,))
+    casters = []
+    for type in types:
+        if not type:
+            casters.append((None, None))
+            continue
+        type = with_number_format(type, number_format)
+        cast = type.caster(numeric)
+        if memo_size:
+            cast = _memoized(cast, memo_size)
+        casters.append((type, cast))
+    return casters
+
+
+def types_processor(types, strict=False, rejects=None, numeric=None,
+                    memo_size=None, number_format=None):
     """ Apply the column types set on the instance to the
     current row, attempting to cast each cell to the specified
-    type.
+    type. The casters of the types are prepared once, and return a
+    marker rather than raising for the cells they cannot cast; these
+    keep their value.
+
+    Strict means that casting errors are not ignored. If a
+    ``CastRejects`` is given as ``rejects``, the cells which cannot be
+    cast are recorded there instead, and reading goes on.
+
+    Numbers are represented according to the ``numeric`` policy (see
+    ``NUMERIC_POLICIES``). With a ``memo_size``, the cast of each
+    distinct string value is remembered for up to that many values per
+    column (see ``column_casters``). Number types which follow the
+    locale read values with ``number_format`` if it is given. These
+    default to the settings of the row set the processor is registered
+    with."""
+    casters = column_casters(types or [], numeric or 'decimal', memo_size,
+                             number_format)
 
-    Strict means that casting errors are not ignored"""
     def apply_types(row_set, row):
         if types is None:
             return row
-        for cell, type in izip_longest(row, types):
-            try:
-                cell.value = type.cast(cell.value)
-                cell.type = type
-            except:
-                if strict and type:
-                    raise
+        if rejects is not None:
+            n = rejects.rows_seen
+            rejects.rows_seen += 1
+        for i, (cell, (type, cast)) in enumerate(izip(row, casters)):
+            if cast is None:
+                continue
+            value = cast(cell.value)
+            if value is CAST_FAILED:
+                if rejects is not None:
+                    rejects.add(n, i, cell.value)
+                elif strict:
+                    type.cast(cell.value)
+                continue
+            cell.value = value
+            cell.type = type
         return row
+
+    def apply_types_values(row_set, row):
+        if types is None:
+            return row
+        if rejects is not None:
+            n = rejects.rows_seen
+            rejects.rows_seen += 1
+        for i, (type, cast) in izip(xrange(len(row)), casters):
+            if cast is None:
+                continue
+            value = cast(row[i])
+            if value is CAST_FAILED:
+                if rejects is not None:
+                    rejects.add(n, i, row[i])
+                elif strict:
+                    type.cast(row[i])
+                continue
+            row[i] = value
+        return row
+    apply_types.on_values = apply_types_values
+    apply_types.builtin = ('types', types, strict, rejects, numeric,
+                           memo_size, number_format)
+
+    def project(columns):
+        if types is None:
+            return apply_types
+        return types_processor([types[i] if i < len(types) else None
+                                for i in columns], strict, rejects,
+                               numeric, memo_size, number_format)
+    apply_types.project = project
     return apply_types
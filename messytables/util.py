@@ -1,3 +1,5 @@
+import threading
+
 try:
     # python 2.7:
     from collections import OrderedDict
@@ -74,6 +76,90 @@ except ImportError:
     ## end of http://code.activestate.com/recipes/576669/ }}}
 
 
+class LRUCache(object):
+    """ A cache of at most ``size`` entries, which forgets the least
+    recently used entry first. Entries are kept in a dict and a doubly
+    linked list of ``[previous, next, key, value]`` links, ordered
+    from the least to the most recently used. """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self._links = {}
+        self._root = root = []
+        root[:] = [root, root, None, None]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._links)
+
+    def get(self, key, default=None):
+        """ Return the value for ``key`` and mark it as recently used,
+        or ``default`` if it is not cached. """
+        with self._lock:
+            link = self._links.get(key)
+            if link is None:
+                return default
+            previous, next, _, value = link
+            previous[1] = next
+            next[0] = previous
+            last = self._root[0]
+            last[1] = self._root[0] = link
+            link[0] = last
+            link[1] = self._root
+            return value
+
+    def set(self, key, value):
+        """ Cache ``value`` for ``key``, dropping the least recently used
+        entry if the cache is full. """
+        with self._lock:
+            if key in self._links:
+                self._links[key][3] = value
+                return
+            root = self._root
+            if len(self._links) >= self.size:
+                oldest = root[1]
+                root[1] = oldest[1]
+                oldest[1][0] = root
+                del self._links[oldest[2]]
+            last = root[0]
+            last[1] = root[0] = self._links[key] = [last, root, key, value]
+
+
+class ValueDictionary(object):
+    """ Dictionary encoding for the values of one column: ``lookup``
+    converts each distinct value once with ``convert`` and then returns
+    the same result object for it every time, so that repeated values
+    share one object and one conversion. Once more than ``size``
+    distinct values have been seen, the column is taken to be too
+    varied for this to pay off: the dictionary is dropped and values
+    are converted one by one. """
+
+    def __init__(self, size, convert):
+        self.size = size
+        self.convert = convert
+        self.values = {}
+
+    def __len__(self):
+        return len(self.values or ())
+
+    @property
+    def dropped(self):
+        return self.values is None
+
+    def lookup(self, value):
+        values = self.values
+        if values is None:
+            return self.convert(value)
+        if value in values:
+            return values[value]
+        result = self.convert(value)
+        if len(values) < self.size:
+            values[value] = result
+        else:
+            self.values = None
+        return result
+
+
 def offset_processor(offset):
     """ Skip ``offset`` from the given iterator. This can
     be used in combination with the ``headers_processor`` to
@@ -88,6 +174,9 @@ def offset_processor(offset):
         if row_set._offset >= offset:
             return row
         row_set._offset += 1
+    apply_offset.on_values = apply_offset
+    apply_offset.builtin = ('offset', offset)
+    apply_offset.project = lambda columns: apply_offset
     return apply_offset
 
 
@@ -103,4 +192,54 @@ def null_processor(nulls):
                 cell.value = None
             return cell
         return [replace(cell) for cell in row]
+
+    def apply_replace_values(row_set, row):
+        return [None if value in nulls else value for value in row]
+    apply_replace.on_values = apply_replace_values
+    apply_replace.builtin = ('null', nulls)
+    apply_replace.project = lambda columns: apply_replace
     return apply_replace
+
+
+def filter_processor(predicate, columns):
+    """ Drop the rows for which ``predicate`` returns a false value.
+    The predicate is called with the values of ``columns``, which are
+    given by index or by column name.
+
+    On a ``RowSet``, names refer to the headers of the registered
+    ``headers_processor``. If only header processors and an offset
+    come before the filter, it is tested on the values as read by the
+    backend, and the other columns of a row are only converted, turned
+    into cells and processed if the row passes.
+
+    :param predicate: Function called with one value per column
+    :param columns: List of column indexes or names
+    :type columns: list
+    """
+    columns = list(columns)
+
+    def apply_filter(row_set, row):
+        values = []
+        for column in columns:
+            if isinstance(column, basestring):
+                cells = [cell for cell in row if cell.column == column]
+            else:
+                cells = row[column:column + 1]
+            values.append(cells[0].value if cells else None)
+        if predicate(*values):
+            return row
+
+    def apply_filter_values(row_set, row):
+        width = len(row)
+        if predicate(*[row[i] if i < width else None for i in columns]):
+            return row
+
+    def project(indexes):
+        if not all(column in indexes for column in columns):
+            return None
+        return filter_processor(predicate,
+                                [indexes.index(c) for c in columns])
+    apply_filter.on_values = apply_filter_values
+    apply_filter.builtin = ('filter', columns, predicate)
+    apply_filter.project = project
+    return apply_filter
@@ -5,16 +5,16 @@ from . import horror_fobj
 from nose.tools import assert_equal
 from nose.plugins.skip import SkipTest
 from messytables import (any_tableset, XLSTableSet, ZIPTableSet, PDFTableSet,
-                         CSVTableSet, ODSTableSet,
+                         CSVTableSet, ODSTableSet, XLSXStreamTableSet,
                          ReadError)
 
 suite = [{'filename': 'simple.csv', 'tableset': CSVTableSet},
          {'filename': 'simple.xls', 'tableset': XLSTableSet},
-         {'filename': 'simple.xlsx', 'tableset': XLSTableSet},
+         {'filename': 'simple.xlsx', 'tableset': XLSXStreamTableSet},
          {'filename': 'simple.zip', 'tableset': ZIPTableSet},
          {'filename': 'simple.ods', 'tableset': ODSTableSet},
          {'filename': 'bian-anal-mca-2005-dols-eng-1011-0312-tab3.xlsm',
-          'tableset': XLSTableSet},
+          'tableset': XLSXStreamTableSet},
          ]
 
 # Special handling for PDFTables - skip if not installed
@@ -1,14 +1,17 @@
 # -*- coding: utf-8 -*-
+import decimal
+import pickle
 import unittest
 import StringIO
 
 from . import horror_fobj
 from nose.plugins.attrib import attr
 from nose.tools import assert_equal
-from messytables import (CSVTableSet, type_guess, headers_guess,
-                         offset_processor, DateType, StringType,
-                         DecimalType, IntegerType,
-                         DateUtilType, BoolType)
+from messytables import (CSVTableSet, Cell, type_guess, headers_guess,
+                         offset_processor, types_processor, DateType,
+                         StringType, DecimalType, IntegerType,
+                         DateUtilType, BoolType, NumberFormat)
+from messytables.types import TokenClassifier, TypeGuesser
 
 
 class TypeGuessTest(unittest.TestCase):
@@ -132,3 +135,102 @@ class TypeGuessTest(unittest.TestCase):
             StringType(), StringType(), StringType(), StringType(),
             StringType(), StringType(), IntegerType(), StringType(),
             StringType()])
+
+    def test_distinct_values_are_tested_once(self):
+        tested = []
+
+        class CountingType(IntegerType):
+            guessing_weight = 2
+
+            def test(self, value):
+                tested.append(value)
+                return super(CountingType, self).test(value)
+
+        csv_file = StringIO.StringIO('1,x\n1,y\n1,x\nfoo,x\nfoo,x\n')
+        rows = CSVTableSet(csv_file).tables[0]
+        guessed_types = type_guess(rows.sample, [StringType, CountingType])
+        assert_equal(guessed_types, [CountingType(), StringType()])
+        # the other values do not have the shape of an integer
+        assert_equal(tested, ['1'])
+
+    def test_token_classifier(self):
+        classify = TokenClassifier().classify
+        shape = classify(u' -1 ')
+        assert_equal((shape.integer, shape.decimal, shape.date),
+                     (True, True, False))
+        shape = classify(u'1.5e3')
+        assert_equal((shape.integer, shape.decimal), (False, True))
+        assert classify(u'-Infinity').decimal
+        assert not classify(u'1 May').decimal
+        shape = classify(u'02 October 2011')
+        assert shape.date
+        assert DateType('%d %B %Y').fits(shape)
+        assert not DateType('%d-%m-%Y').fits(shape)
+        assert not DateType('%d %B %YT%H:%M:%S').fits(shape)
+
+    def test_number_format_guess(self):
+        accounts = NumberFormat(',', '.', parens=True)
+        rows = [[Cell(u'(12)')], [Cell(u'1,000')]]
+        assert_equal(type_guess(rows, strict=True), [StringType()])
+        assert_equal(type_guess(rows, strict=True, number_format=accounts),
+                     [IntegerType()])
+        rows = [[Cell(u'1.234,5')], [Cell(u'12')]]
+        german = NumberFormat('.', ',')
+        guessed = type_guess(rows, strict=True, number_format=german)
+        assert_equal(guessed, [DecimalType()])
+        assert_equal(guessed[0].number_format, german)
+        # the shapes of another format do not rule a value out
+        shape = TokenClassifier().classify(u'1.234,5')
+        assert not DecimalType().fits(shape)
+        assert DecimalType(german).fits(shape)
+        assert DecimalType(german).test(u'1.234,5')
+
+    def test_row_set_number_format(self):
+        csv_file = StringIO.StringIO('a,b\n(12),"1.234,5"\n3,"(0,5)"\n')
+        row_set = CSVTableSet(csv_file).tables[0]
+        row_set.register_processor(offset_processor(1))
+        row_set.number_format = NumberFormat('.', ',', parens=True)
+        types = type_guess(row_set.sample, strict=True,
+                           number_format=row_set.number_format)
+        assert_equal(types, [IntegerType(), DecimalType()])
+        row_set.register_processor(types_processor([IntegerType(),
+                                                    DecimalType()],
+                                                   strict=True))
+        assert_equal([[c.value for c in row] for row in row_set],
+                     [[-12, decimal.Decimal('1234.5')],
+                      [3, decimal.Decimal('-0.5')]])
+
+    def test_merged_guessers(self):
+        csv_file = StringIO.StringIO('1,2012/2/12,x\n2,,y\n3.5,2012/2/13\n'
+                                     '4,2012/2/14,z\n5,foo,\n6,2012/2/15\n')
+        rows = list(CSVTableSet(csv_file).tables[0])
+        for strict in (False, True):
+            guessers = [TypeGuesser(strict=strict).update(rows[i::2])
+                        for i in range(2)]
+            guesser = pickle.loads(pickle.dumps(guessers[0]))
+            guesser.merge(guessers[1])
+            assert_equal(guesser.result(), type_guess(rows, strict=strict))
+        assert_equal(guesser.result(),
+                     [DecimalType(), StringType(), StringType()])
+        self.assertRaises(ValueError, guesser.merge, TypeGuesser())
+
+    def test_strict_guess_settles(self):
+        read = []
+
+        def rows():
+            for i in xrange(5000):
+                read.append(i)
+                yield [Cell(u'x%d' % i), Cell(unicode(i % 7))]
+
+        guesser = TypeGuesser(strict=True).update(rows())
+        assert_equal(guesser.settled_columns(), set([0]))
+        assert not guesser.settled
+        assert_equal(guesser.result(), [StringType(), IntegerType()])
+
+        del read[:]
+        guesser = TypeGuesser([StringType, IntegerType], strict=True)
+        guesser.update(([c, Cell(u'-')] for c, _ in rows()),
+                       until_settled=True)
+        assert guesser.settled
+        assert len(read) < 5000
+        assert_equal(guesser.result(), [StringType(), StringType()])
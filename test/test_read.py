@@ -14,12 +14,14 @@ except ImportError:
 
 from messytables import (CSVTableSet, StringType, HTMLTableSet,
                          ZIPTableSet, XLSTableSet, XLSXTableSet, PDFTableSet,
-                         ODSTableSet, headers_guess, headers_processor,
-                         offset_processor, DateType, FloatType,
+                         XLSXStreamTableSet, ODSTableSet, ODSRowSet,
+                         headers_guess, headers_processor,
+                         offset_processor, DateType, DecimalType, FloatType,
                          IntegerType, BoolType, rowset_as_jts,
                          types_processor, type_guess, ReadError,
                          null_processor)
 import datetime
+import decimal
 
 
 class ReadCsvTest(unittest.TestCase):
@@ -60,6 +62,28 @@ class ReadCsvTest(unittest.TestCase):
         row = list(row_set.sample)[0]
         assert_equal(len(row), 1)
 
+    def test_sample_is_parsed_once(self):
+        fh = horror_fobj('simple.csv')
+        row_set = CSVTableSet(fh).tables[0]
+        calls = []
+        parse = row_set._parse
+
+        def counting_parse(*args, **kwargs):
+            calls.append(1)
+            return parse(*args, **kwargs)
+        row_set._parse = counting_parse
+
+        headers_guess(row_set.sample)
+        type_guess(row_set.sample)
+        first = list(row_set.sample)
+        first[1][1].value = 'changed'
+        assert_equal(list(row_set.sample)[1][1].value, u'1')
+        assert_equal(len(calls), 1)
+
+        # changing the dialect overrides parses the sample again
+        row_set.delimiter = ';'
+        assert_equal(len(list(row_set.sample)[0]), 1)
+
     def test_read_head_padding_csv(self):
         fh = horror_fobj('weird_head_padding.csv')
         table_set = CSVTableSet(fh)
@@ -151,6 +175,162 @@ class ReadCsvTest(unittest.TestCase):
         assert_equal(nones[1], [False, False, False, True])
         assert_equal(nones[2], [False, True, True, True])
 
+    def test_tuples_match_cells(self):
+        fh = horror_fobj('simple.csv')
+        row_set = CSVTableSet(fh).tables[0]
+        offset, headers = headers_guess(row_set.sample)
+        row_set.register_processor(headers_processor(headers))
+        row_set.register_processor(offset_processor(offset + 1))
+        types = type_guess(row_set.sample, strict=True)
+        row_set.register_processor(types_processor(types))
+        expected = [tuple(c.value for c in row) for row in row_set]
+        assert_equal(list(row_set.tuples()), expected)
+        assert_equal(list(row_set.tuples(sample=True)), expected)
+        assert_equal(expected[0][0], datetime.datetime(2011, 1, 1))
+
+    def test_tuples_with_custom_processor(self):
+        fh = horror_fobj('simple.csv')
+        row_set = CSVTableSet(fh).tables[0]
+        row_set.register_processor(offset_processor(1))
+
+        def upper(row_set, row):
+            for cell in row:
+                cell.value = cell.value.upper()
+            return row
+        row_set.register_processor(upper)
+        data = list(row_set.tuples())
+        assert_equal(6, len(data))
+        assert_equal(data[-1][2], u'BERKELEY')
+
+    def test_batches(self):
+        fh = horror_fobj('simple.csv')
+        row_set = CSVTableSet(fh).tables[0]
+        row_set.register_processor(offset_processor(1))
+        batches = list(row_set.batches(4))
+        assert_equal(2, len(batches))
+        assert_equal(3, len(batches[0]))
+        assert_equal(batches[0][2], [u'Galway'] * 3 + [u'Berkeley'])
+        assert_equal(batches[1][1], [u'8', u'5'])
+
+    def test_parallel_tuples(self):
+        from StringIO import StringIO
+        lines = ['id,name,amount']
+        for i in range(200):
+            lines.append('%d,"name ""%d""\nsecond line",%d.5' % (i, i, i))
+        data = '\r\n'.join(lines) + '\r\n'
+
+        def row_set():
+            row_set = CSVTableSet(StringIO(data)).tables[0]
+            row_set.register_processor(headers_processor(['id', 'name']))
+            row_set.register_processor(offset_processor(1))
+            row_set.register_processor(types_processor(
+                [IntegerType(), StringType(), FloatType()], strict=True))
+            return row_set
+        expected = list(row_set().tuples())
+        assert_equal(200, len(expected))
+        assert_equal(expected[3][1], u'name "3"\nsecond line')
+        rows = list(row_set().parallel_tuples(workers=2, chunk_size=100))
+        assert_equal(rows, expected)
+
+    def test_dictionary_encoding(self):
+        from StringIO import StringIO
+        data = ''.join('%d,%s,2.5\r\n' % (i, 'ab'[i % 2]) for i in range(20))
+
+        def row_set(size):
+            row_set = CSVTableSet(StringIO(data)).tables[0]
+            row_set.dictionary_size = size
+            row_set.register_processor(types_processor(
+                [StringType(), StringType(), FloatType()]))
+            return row_set
+        expected = list(row_set(None).tuples())
+        rows = list(row_set(5).tuples())
+        assert_equal(rows, expected)
+        # repeated values share one object, for the text and the casts
+        assert rows[0][1] is rows[2][1]
+        assert rows[0][2] is rows[1][2]
+        # the first column has too many values and is read as usual
+        assert_equal(rows[19][0], u'19')
+        assert_equal([[c.value for c in row] for row in row_set(5)],
+                     [list(row) for row in expected])
+
+    def test_row_index(self):
+        import os
+        import tempfile
+        from StringIO import StringIO
+        data = 'a,b\r\n1,"x\r\ny"\r\n2,z\r\n\r\n3,"q ""r"""'
+        row_set = CSVTableSet(StringIO(data)).tables[0]
+        self.assertRaises(TypeError, len, row_set)
+        row_set.build_index()
+        assert_equal(5, len(row_set))
+        assert_equal([c.value for c in row_set[1]], [u'1', u'x\ny'])
+        assert_equal([c.value for c in row_set[-1]], [u'3', u'q "r"'])
+        assert_equal([[c.value for c in row] for row in row_set[2:4]],
+                     [[u'2', u'z'], []])
+        assert_equal([r[0].value for r in row_set[::2]], [u'a', u'2', u'3'])
+        self.assertRaises(IndexError, lambda: row_set[5])
+
+        # the index can be saved, and building it does not disturb reading
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            row_set.save_index(filename)
+            other = CSVTableSet(StringIO(data)).tables[0]
+            other.load_index(filename)
+            assert_equal(list(other.row_index), list(row_set.row_index))
+        finally:
+            os.remove(filename)
+        assert_equal(5, len(list(row_set)))
+
+    def test_spread_sample(self):
+        from StringIO import StringIO
+        data = 'n,text\r\n1,"t\r\n1"\r\n' + \
+            ''.join('%d,"t ""%d"""\r\n' % (i, i) for i in range(2, 100))
+        row_set = CSVTableSet(StringIO(data), window=10).tables[0]
+        row_set.sample_head = 2
+        assert_equal([r[0].value for r in row_set.sample][:3],
+                     [u'n', u'1', u'2'])
+        row_set.sampling = 'spread'
+        rows = [[c.value for c in r] for r in row_set.sample]
+        assert_equal(rows[:2], [[u'n', u'text'], [u'1', u't\n1']])
+        assert_equal(rows[2], [u'2', u't "2"'])
+        assert int(rows[-1][0]) > 80
+        row_set.build_index()
+        row_set.sampling = 'random'
+        rows = [[c.value for c in r] for r in row_set.sample]
+        assert_equal(len(rows), 10)
+        numbers = [int(r[0]) for r in rows[2:]]
+        assert_equal(numbers, sorted(set(numbers)))
+        assert_equal(rows[3][1], u't "%d"' % numbers[1])
+        # reading the sample does not disturb the main iterator
+        assert_equal(100, len(list(row_set)))
+
+    def test_raw_range(self):
+        fh = horror_fobj('simple.csv')
+        row_set = CSVTableSet(fh).tables[0]
+        rows = [[c.value for c in row] for row in row_set.raw()]
+        part = [[c.value for c in row]
+                for row in row_set.raw(skip=2, limit=3)]
+        assert_equal(part, rows[2:5])
+        assert_equal(list(row_set.raw_values(sample=True, skip=1, limit=2)),
+                     rows[1:3])
+        row_set.build_index()
+        assert_equal(list(row_set.raw_values(skip=4, limit=100)), rows[4:])
+
+    def test_offset_pushdown(self):
+        fh = horror_fobj('simple.csv')
+        row_set = CSVTableSet(fh).tables[0]
+        offset, headers = headers_guess(row_set.sample)
+        row_set.register_processor(headers_processor(headers))
+        row_set.register_processor(offset_processor(offset + 1))
+        skip, processors = row_set._split_offset()
+        assert_equal(skip, offset + 1)
+        assert_equal(len(processors), 1)
+        data = list(row_set)
+        assert_equal(len(data), 6)
+        assert_equal(data[0][0].column, 'date')
+        assert_equal([tuple(c.value for c in row) for row in data],
+                     list(row_set.tuples()))
+
     def test_read_encoded_csv(self):
         fh = horror_fobj('utf-16le_encoded.csv')
         table_set = CSVTableSet(fh)
@@ -159,6 +339,18 @@ class ReadCsvTest(unittest.TestCase):
         row = list(row_set.sample)[0]
         assert_equal(row[1].value, 'Organisation_name')
 
+    def test_read_latin1_csv(self):
+        from StringIO import StringIO
+        fh = StringIO(u'name,city\nJos\xe9,M\xfcnchen\n'.encode('latin-1'))
+        row_set = CSVTableSet(fh, encoding='latin-1').tables[0]
+        assert_equal(list(row_set.tuples())[1], (u'Jos\xe9', u'M\xfcnchen'))
+
+    def test_read_invalid_utf8_csv(self):
+        from StringIO import StringIO
+        fh = StringIO('name,city\nJos\xff,Berlin\n')
+        row_set = CSVTableSet(fh, encoding='utf-8').tables[0]
+        assert_equal(list(row_set.tuples())[1], (u'Jos', u'Berlin'))
+
     def test_long_csv(self):
         fh = horror_fobj('long.csv')
         table_set = CSVTableSet(fh)
@@ -305,6 +497,78 @@ class ReadODSTest(unittest.TestCase):
         for row in row_set.sample:
             assert len(row) == 5, len(row)
 
+    def test_ods_tuples(self):
+        fh = horror_fobj('simple.ods')
+        row_set = ODSTableSet(fh).tables[0]
+        expected = [tuple(c.value for c in row) for row in row_set]
+        assert_equal(list(row_set.tuples()), expected)
+        assert_equal([tuple(row) for row in row_set.raw_values(skip=1)],
+                     expected[1:])
+        assert_equal([tuple(row) for row in row_set.raw_values(columns=[1])],
+                     [row[1:2] for row in expected])
+
+    def test_ods_numeric_float(self):
+        fh = horror_fobj('simple.ods')
+        row_set = ODSTableSet(fh).tables[0]
+        row = list(row_set.sample)[1]
+        assert_equal((row[1].value, row[1].type),
+                     (decimal.Decimal('20'), DecimalType()))
+        row_set.numeric = 'float'
+        row = list(row_set.sample)[1]
+        assert_equal(row[1].value, 20.0)
+        assert_equal(list(row_set.tuples())[2][1], 23.0)
+
+    def test_ods_number_without_stored_value(self):
+        sheet = ('<table:table table:name="t"><table:table-row>'
+                 '<table:table-cell office:value-type="float">'
+                 '<text:p>n/a</text:p></table:table-cell>'
+                 '<table:table-cell office:value-type="float" '
+                 'office:value="oops"><text:p>1,5</text:p></table:table-cell>'
+                 '<table:table-cell office:value-type="float" '
+                 'office:value="2.5"><text:p>2,50</text:p></table:table-cell>'
+                 '</table:table-row></table:table>')
+        row_set = ODSRowSet(sheet)
+        row_set.numeric = 'float'
+        assert_equal(list(row_set.raw_values()), [[u'n/a', u'1,5', 2.5]])
+        assert_equal([c.type for c in list(row_set)[0]],
+                     [StringType(), StringType(), DecimalType()])
+
+    def test_ods_number_cells(self):
+        sheet = ('<table:table table:name="t"><table:table-row>'
+                 '<table:table-cell office:value-type="float" '
+                 'office:value="1234.5"><text:p>1.234,50</text:p>'
+                 '</table:table-cell>'
+                 '<table:table-cell office:value-type="percentage" '
+                 'office:value="0.125"><text:p>12,5%</text:p>'
+                 '</table:table-cell>'
+                 '<table:table-cell office:value-type="currency" '
+                 'office:currency="EUR" office:value="-3"><text:p>-3,00 EUR'
+                 '</text:p></table:table-cell>'
+                 '</table:table-row></table:table>')
+        row_set = ODSRowSet(sheet)
+        row_set.register_processor(types_processor([DecimalType()] * 3,
+                                                   strict=True))
+        row = list(row_set)[0]
+        assert_equal([c.type for c in row], [DecimalType()] * 3)
+        assert_equal([repr(c.value) for c in row],
+                     [repr(decimal.Decimal(v)) for v in
+                      ('1234.5', '0.125', '-3')])
+        row_set.numeric = 'float'
+        row = list(row_set)[0]
+        assert_equal([c.type for c in row], [DecimalType()] * 3)
+        assert_equal([c.value for c in row], [1234.5, 0.125, -3.0])
+        assert_equal([type(c.value) for c in row], [float] * 3)
+
+    def test_ods_cell_types(self):
+        fh = horror_fobj('simple.ods')
+        row_set = ODSTableSet(fh).tables[0]
+        rows = list(row_set)
+        assert_equal([c.type for c in rows[0]], [StringType()] * 3)
+        assert_equal([(c.value, c.type) for c in rows[1]],
+                     [(u'Bob', StringType()),
+                      (decimal.Decimal('20'), DecimalType()),
+                      (u'10/10/10', DateType(None))])
+
     def test_annotated_ods(self):
         fh = horror_fobj('annotated.ods')
         table_set = ODSTableSet(fh)
@@ -317,6 +581,13 @@ class ReadODSTest(unittest.TestCase):
         l = len(list(row_set.sample))
         assert 87 == l, l
 
+    def test_ods_sample_is_limited_to_window(self):
+        fh = horror_fobj('annotated.ods')
+        row_set = ODSTableSet(fh, window=10).tables[1]
+        assert_equal(10, len(list(row_set.sample)))
+        assert_equal(10, len(row_set._sample_cache[1]))
+        assert_equal(87, len(list(row_set)))
+
 
 class XlsxBackwardsCompatibilityTest(unittest.TestCase):
     def test_that_xlsx_is_handled_by_xls_table_set(self):
@@ -333,6 +604,15 @@ class ReadXlsTest(unittest.TestCase):
         cls.large_xlsx_table_set = XLSTableSet(   # TODO
             horror_fobj('large.xlsx'))
 
+    def test_spread_xls_sample(self):
+        fh = horror_fobj('simple.xls')
+        row_set = XLSTableSet(fh).tables[0]
+        row_set.window = 4
+        row_set.sample_head = 2
+        row_set.sampling = 'spread'
+        dates = [row[0].value for row in row_set][2:6:2]
+        assert_equal([row[0].value for row in row_set.sample][2:], dates)
+
     def test_read_simple_xls(self):
         fh = horror_fobj('simple.xls')
         table_set = XLSTableSet(fh)
@@ -441,6 +721,25 @@ class ReadXlsTest(unittest.TestCase):
         num_cells = sum(len(row) for row in table)
         assert_equal(num_rows * num_cols, num_cells)
 
+    def test_xls_tuples(self):
+        fh = horror_fobj('simple.xls')
+        row_set = XLSTableSet(fh).tables[0]
+        expected = [tuple(c.value for c in row) for row in row_set]
+        data = list(row_set.tuples())
+        assert_equal(data, expected)
+        assert_equal(data[2][0], datetime.datetime(2011, 1, 2, 0, 0))
+        assert_equal(list(row_set.raw_values(skip=1, limit=2)),
+                     [list(row) for row in data[1:3]])
+        assert_equal(list(row_set.raw_values(columns=[0, 3])),
+                     [[row[0], None] for row in data])
+        assert_equal([[c.value for c in row]
+                      for row in row_set.raw(columns=[2, 0])],
+                     [[row[2], row[0]] for row in data])
+        where = [([0, 2], lambda date, name: (date, name) == data[2][::2])]
+        assert_equal(list(row_set.raw_values(where=where)), [list(data[2])])
+        assert_equal([[c.value for c in row] for row in row_set.raw(where=where)],
+                     [list(data[2])])
+
     def test_read_type_know_simple(self):
         fh = horror_fobj('simple.xls')
         table_set = XLSTableSet(fh)
@@ -458,6 +757,61 @@ class ReadXlsTest(unittest.TestCase):
         assert_equal(1000, len(list(tables[1].sample)))
 
 
+class ReadXlsxStreamTest(unittest.TestCase):
+    def test_read_simple_xlsx(self):
+        fh = horror_fobj('simple.xlsx')
+        table_set = XLSXStreamTableSet(fh)
+        assert_equal(1, len(table_set.tables))
+        row_set = table_set.tables[0]
+        rows = list(row_set)
+        assert_equal([c.value for c in rows[0]],
+                     [u'date', u'temperature', u'place'])
+        assert_equal([c.value for c in rows[2]],
+                     [datetime.datetime(2011, 1, 2, 0, 0), -1.0, u'Galway'])
+        assert_equal([c.type for c in rows[2]],
+                     [DateType(None), FloatType(), StringType()])
+        expected = [[c.value for c in row]
+                    for row in XLSTableSet(horror_fobj('simple.xlsx')).tables[0]]
+        assert_equal(list(row_set.raw_values()), expected)
+
+    def test_rows_are_padded_to_sheet_width(self):
+        name = 'bian-anal-mca-2005-dols-eng-1011-0312-tab3.xlsm'
+        row_set = XLSXStreamTableSet(horror_fobj(name)).tables[0]
+        rows = list(row_set.raw_values())
+        # the <dimension> of the sheet is A1:O66
+        assert_equal(set(len(row) for row in rows), set([15]))
+        expected = list(XLSTableSet(horror_fobj(name)).tables[0].raw_values())
+        assert_equal([row[:12] for row in rows], expected)
+        assert_equal(rows[0][12:], [u''] * 3)
+        _, headers = headers_guess(row_set.sample)
+        assert_equal(len(headers), 15)
+
+    def test_raw_values_slicing(self):
+        fh = horror_fobj('simple.xlsx')
+        row_set = XLSXStreamTableSet(fh).tables[0]
+        data = list(row_set.raw_values())
+        assert_equal(list(row_set.raw_values(skip=1, limit=2)), data[1:3])
+        assert_equal(list(row_set.raw_values(columns=[2, 0])),
+                     [[row[2], row[0]] for row in data])
+        where = [([2], lambda place: place == u'Galway')]
+        assert_equal(list(row_set.raw_values(where=where)),
+                     [row for row in data if row[2] == u'Galway'])
+
+    def test_large_file_data_sheet(self):
+        table_set = XLSXStreamTableSet(horror_fobj('large.xlsx'))
+        table = table_set['data']
+        assert_equal(8547, sum(1 for _ in table.raw_values()))
+        assert_equal(1000, len(list(table.sample)))
+        table.window = 10
+        table.sample_head = 2
+        table.sampling = 'spread'
+        assert_equal(10, len(list(table.sample)))
+
+    def test_not_a_workbook(self):
+        fh = horror_fobj('simple.csv')
+        self.assertRaises(ReadError, lambda: XLSXStreamTableSet(fh))
+
+
 class ReadHtmlTest(unittest.TestCase):
     def test_read_real_html(self):
         fh = horror_fobj('html.html')
@@ -469,6 +823,42 @@ class ReadHtmlTest(unittest.TestCase):
         assert_equal(row[1].value.strip(), 'Country')
         assert_equal(row[4].value.strip(), '2010')
 
+    def test_html_types_processor(self):
+        for filename in ('html.html', 'invisible_text.html',
+                         'rowcolspan.html'):
+            row_set = HTMLTableSet(horror_fobj(filename)).tables[0]
+            types = type_guess(row_set.sample)
+            row_set.register_processor(types_processor(types))
+            assert list(row_set), filename
+        fh = horror_fobj('html.html')
+        row_set = HTMLTableSet(fh).tables[0]
+        row_set.register_processor(null_processor([u'..']))
+        row_set.register_processor(types_processor(
+            [StringType(), StringType(), IntegerType()]))
+        row = list(row_set)[1]
+        assert_equal([c.value for c in row[:3]],
+                     [None, u'Very high human development', 11])
+        assert_equal(row[2].type, IntegerType())
+
+    def test_span_html_tuples(self):
+        fh = horror_fobj('rowcolspan.html')
+        row_set = HTMLTableSet(fh).tables[0]
+        expected = [tuple(c.value for c in row) for row in row_set]
+        assert_equal(list(row_set.tuples()), expected)
+        assert_equal([tuple(c.value for c in row)
+                      for row in row_set.raw(skip=2, limit=2)],
+                     expected[2:4])
+        width = max(len(row) for row in expected)
+        columns = range(width - 1, -1, -1)
+        assert_equal([tuple(row) for row in row_set.raw_values(columns=columns)],
+                     [tuple(row[i] for i in columns) for row in expected])
+        assert_equal([tuple(c.value for c in row)
+                      for row in row_set.raw(columns=columns)],
+                     [tuple(row[i] for i in columns) for row in expected])
+        where = [([1], lambda value: value == expected[2][1])]
+        assert_equal([tuple(row) for row in row_set.raw_values(where=where)],
+                     [row for row in expected if row[1] == expected[2][1]])
+
     def test_invisible_text_html(self):
         fh = horror_fobj('invisible_text.html')
         table_set = HTMLTableSet(fh)
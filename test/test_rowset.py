@@ -1,8 +1,20 @@
 # -*- coding: utf-8 -*-
 
+from array import array
+from itertools import izip_longest
+import decimal
 import unittest
+import StringIO
 from . import horror_fobj
+from nose.tools import assert_equal
 from messytables.any import any_tableset
+from messytables import (CSVTableSet, RowSet, Cell, headers_processor,
+                         offset_processor,
+                         null_processor, types_processor, filter_processor,
+                         IntegerType, DecimalType,
+                         BoolType, StringType)
+from messytables.error import NoSuchColumnError
+from messytables.types import CastRejects
 
 
 class TestRowSet(unittest.TestCase):
@@ -16,3 +28,313 @@ class TestRowSet(unittest.TestCase):
 
         x = repr(table_set.tables)
         self.assertTrue(isinstance(x, str))
+
+
+class OldStyleRowSet(RowSet):
+    """ A row set whose ``raw`` only takes ``sample``, as third-party
+    row sets written before the pushdown arguments do. """
+
+    def __init__(self, rows):
+        self.rows = rows
+        super(OldStyleRowSet, self).__init__()
+
+    def raw(self, sample=False):
+        for row in self.rows[:2] if sample else self.rows:
+            yield [Cell(value) for value in row]
+
+
+class TestOldStyleRaw(unittest.TestCase):
+    def setUp(self):
+        self.row_set = OldStyleRowSet([['a', 'b'], ['1', '2'], ['3', '4'],
+                                       ['5']])
+        self.row_set.register_processor(offset_processor(1))
+
+    def test_iterate(self):
+        assert_equal([[c.value for c in row] for row in self.row_set],
+                     [['1', '2'], ['3', '4'], ['5']])
+        assert_equal([[c.value for c in row] for row in self.row_set.sample],
+                     [['1', '2']])
+        assert_equal(list(self.row_set.tuples()),
+                     [('1', '2'), ('3', '4'), ('5',)])
+
+    def test_select_and_filter(self):
+        self.row_set.register_processor(
+            filter_processor(lambda value: value != '3', [0]))
+        self.row_set.select([1])
+        assert_equal([[c.value for c in row] for row in self.row_set],
+                     [['2'], [None]])
+        assert_equal(list(self.row_set.tuples()), [('2',), (None,)])
+        assert_equal(list(self.row_set.raw_values(skip=1, limit=2)),
+                     [['1', '2'], ['3', '4']])
+
+
+class TestProcessorChain(unittest.TestCase):
+    def check_chain(self, processors):
+        csv = StringIO.StringIO('a,b\n1,yes\nnull,no,extra\n3\n')
+        row_set = CSVTableSet(csv).tables[0]
+        for processor in processors:
+            row_set.register_processor(processor)
+        fused = [[(c.column, c.column_autogenerated, c.type, c.value)
+                  for c in row] for row in row_set]
+
+        expected = []
+        for row in row_set.raw():
+            for processor in processors:
+                row = processor(row_set, row)
+                if row is None:
+                    break
+            if row is not None:
+                expected.append([(c.column, c.column_autogenerated,
+                                  c.type, c.value) for c in row])
+        row_set._offset = 0
+        assert_equal(fused, expected)
+        return fused
+
+    def test_standard_chain(self):
+        rows = self.check_chain([
+            headers_processor(['a', '', 'c']),
+            offset_processor(1),
+            null_processor(['null']),
+            types_processor([IntegerType(), BoolType()])])
+        assert_equal(rows[1][0], ('a', False, IntegerType(), None))
+        assert_equal(rows[1][1], ('column_1', True, BoolType(), False))
+        assert_equal(rows[1][2], ('c', False, StringType(), 'extra'))
+
+    def test_chain_with_custom_processor(self):
+        def drop_short(row_set, row):
+            if len([c for c in row if c.value]) > 1:
+                return row
+        self.check_chain([
+            types_processor([IntegerType()]),
+            null_processor([1]),
+            drop_short,
+            headers_processor(['x']),
+            offset_processor(1)])
+
+
+class TestCastRejects(unittest.TestCase):
+    def test_rejects(self):
+        for nulls in ([], ['-']):
+            csv = StringIO.StringIO('1,yes\nx,maybe\n-,no\n4,true\n')
+            row_set = CSVTableSet(csv).tables[0]
+            rejects = CastRejects()
+            row_set.register_processor(null_processor(nulls))
+            row_set.register_processor(types_processor(
+                [IntegerType(), BoolType()], strict=True, rejects=rejects))
+            rows = [[c.value for c in row] for row in row_set]
+            assert_equal(rows[1], [u'x', u'maybe'])
+            assert_equal(rows[3], [4, True])
+            expected = [(1, 0, u'x'), (1, 1, u'maybe')]
+            if not nulls:
+                expected.append((2, 0, u'-'))
+            assert_equal(list(rejects), expected)
+            assert_equal(rejects.column_counts()[0], len(expected) - 1)
+            # the values are rejected the same way without cells
+            list(row_set.tuples())
+            assert_equal(list(rejects), expected)
+
+    def test_rejects_count_rows_of_each_read(self):
+        csv = StringIO.StringIO('a\n1\nx\n3\ny\n')
+        row_set = CSVTableSet(csv, window=3).tables[0]
+        rejects = CastRejects()
+        row_set.register_processor(offset_processor(1))
+        row_set.register_processor(types_processor([IntegerType()],
+                                                   rejects=rejects))
+        list(row_set.sample)
+        assert_equal(list(rejects), [(1, 0, u'x')])
+        rows = list(row_set.tuples())
+        assert_equal(list(rejects), [(1, 0, u'x'), (3, 0, u'y')])
+        assert_equal([rows[row][column] for row, column, _ in rejects],
+                     [u'x', u'y'])
+
+    def test_strict_raises_without_rejects(self):
+        csv = StringIO.StringIO('1\nx\n')
+        row_set = CSVTableSet(csv).tables[0]
+        row_set.register_processor(types_processor([IntegerType()], True))
+        self.assertRaises(ValueError, list, row_set)
+
+
+class TestNumericPolicy(unittest.TestCase):
+    def make_row_set(self, numeric):
+        csv = StringIO.StringIO('1,1.5,x\n2,,y\n3,2.25,z\n')
+        row_set = CSVTableSet(csv).tables[0]
+        row_set.numeric = numeric
+        row_set.register_processor(types_processor(
+            [IntegerType(), DecimalType(), StringType()]))
+        return row_set
+
+    def test_float(self):
+        row_set = self.make_row_set('float')
+        rows = list(row_set.tuples())
+        assert_equal(rows[0], (1, 1.5, u'x'))
+        assert_equal(type(rows[0][1]), float)
+        assert_equal([tuple(c.value for c in row) for row in row_set], rows)
+        # a policy given to the processor overrides the row set's
+        row_set = self.make_row_set('float')
+        row_set._processors = [types_processor(
+            [IntegerType(), DecimalType()], numeric='decimal')]
+        assert_equal(type(row_set.tuples().next()[1]), decimal.Decimal)
+
+    def test_array_batches(self):
+        row_set = self.make_row_set('array')
+        batch = list(row_set.batches(size=2))[1]
+        assert_equal(batch[0], array('l', [3]))
+        assert_equal(batch[1], array('d', [2.25]))
+        assert_equal(batch[2], [u'z'])
+        # columns with missing values are not packed
+        batch = row_set.batches(size=2).next()
+        assert_equal(batch[1], [1.5, None])
+
+    def test_unknown_policy(self):
+        row_set = self.make_row_set('double')
+        self.assertRaises(ValueError, list, row_set)
+
+
+class TestBatches(unittest.TestCase):
+    def make_row_set(self, *processors):
+        csv = StringIO.StringIO('a,b\n1,yes\nnull,no,extra\nx,maybe\n4\n')
+        row_set = CSVTableSet(csv).tables[0]
+        for processor in processors:
+            row_set.register_processor(processor)
+        return row_set
+
+    def transposed_tuples(self, row_set, size):
+        rows = list(row_set.tuples())
+        return [[list(column) for column in izip_longest(*rows[i:i + size])]
+                for i in xrange(0, len(rows), size)]
+
+    def test_columns_are_processed_like_rows(self):
+        rejects = CastRejects()
+        row_set = self.make_row_set(
+            headers_processor(['a', 'b']), offset_processor(1),
+            null_processor(['null']),
+            types_processor([IntegerType(), BoolType()], rejects=rejects))
+        batches = list(row_set.batches(size=3))
+        assert_equal(batches, [[[1, None, u'x'], [True, False, u'maybe'],
+                                [None, u'extra', None]],
+                               [[4], [None]]])
+        rejected = list(rejects)
+        assert_equal(rejected[:2], [(2, 0, u'x'), (2, 1, u'maybe')])
+        assert_equal(batches, self.transposed_tuples(row_set, 3))
+        assert_equal(list(rejects), rejected)
+
+    def test_row_set_types(self):
+        row_set = self.make_row_set(offset_processor(1))
+        row_set.types = [IntegerType()]
+        assert_equal(row_set.batches().next()[0], [1, u'null', u'x', 4])
+        # a registered type processor takes precedence
+        row_set.register_processor(types_processor([StringType(),
+                                                    BoolType()]))
+        assert_equal(row_set.batches().next()[:2],
+                     [[u'1', u'null', u'x', u'4'],
+                      [True, False, u'maybe', None]])
+
+    def test_custom_processor(self):
+        def drop_x(row_set, row):
+            if row[0].value != 'x':
+                return row
+        row_set = self.make_row_set(offset_processor(1), drop_x,
+                                    types_processor([IntegerType()]))
+        assert_equal(row_set.batches().next()[0], [1, u'null', 4])
+
+
+class TestSelect(unittest.TestCase):
+    def make_row_set(self, *processors):
+        csv = StringIO.StringIO('a,,c\n1,yes,x\nnull,no\n3,,z,extra\n')
+        row_set = CSVTableSet(csv).tables[0]
+        for processor in processors:
+            row_set.register_processor(processor)
+        return row_set
+
+    def check_select(self, columns, indexes, processors):
+        full = [[(c.column, c.column_autogenerated, c.type, c.value)
+                 for c in row] for row in self.make_row_set(*processors)]
+        row_set = self.make_row_set(*processors)
+        row_set.select(columns)
+        selected = [[(c.column, c.column_autogenerated, c.type, c.value)
+                     for c in row] for row in row_set]
+        assert_equal(selected, [[row[i] for i in indexes] for row in full])
+        row_set = self.make_row_set(*processors)
+        row_set.select(columns)
+        assert_equal(list(row_set.tuples()),
+                     [tuple(row[i][3] for i in indexes) for row in full])
+
+    def test_select_pushdown(self):
+        processors = [
+            headers_processor(['a', '', 'c']),
+            offset_processor(1),
+            null_processor(['null']),
+            types_processor([IntegerType(), BoolType()])]
+        row_set = self.make_row_set(*processors)
+        assert_equal(row_set._plan()[2], None)
+        row_set.select(['c', 1, 'a'])
+        assert_equal(row_set._plan()[2], [2, 1, 0])
+        self.check_select(['c', 1, 'a'], [2, 1, 0], processors)
+
+    def test_select_with_custom_processor(self):
+        def keep(row_set, row):
+            return row
+        self.check_select([2, 0], [2, 0],
+                          [headers_processor(['a', '', 'c']), keep])
+
+    def test_select_short_rows(self):
+        row_set = self.make_row_set()
+        row_set.select([3])
+        assert_equal(list(row_set.tuples()),
+                     [(None,), (None,), (None,), ('extra',)])
+
+    def test_select_unknown_column(self):
+        row_set = self.make_row_set(headers_processor(['a', '', 'c']))
+        row_set.select(['b'])
+        self.assertRaises(NoSuchColumnError, list, row_set)
+        row_set.select(None)
+        assert_equal(len(list(row_set)), 4)
+
+
+class TestFilter(unittest.TestCase):
+    def make_row_set(self, *processors):
+        csv = StringIO.StringIO('a,b,c\n1,yes,x\n2,no\n3,yes,z\nnull,no,y\n')
+        row_set = CSVTableSet(csv).tables[0]
+        for processor in processors:
+            row_set.register_processor(processor)
+        return row_set
+
+    def values(self, row_set):
+        return [[c.value for c in row] for row in row_set]
+
+    def test_filter_at_source(self):
+        tested = []
+
+        def is_yes(value):
+            tested.append(value)
+            return value == 'yes'
+        row_set = self.make_row_set(
+            headers_processor(['a', 'b', 'c']),
+            offset_processor(1),
+            filter_processor(is_yes, ['b']),
+            types_processor([IntegerType()]))
+        skip, where, _, processors, _ = row_set._plan()
+        assert_equal((skip, [columns for columns, _ in where]), (1, [[1]]))
+        assert_equal(len(processors), 2)
+        assert_equal(self.values(row_set), [[1, 'yes', 'x'], [3, 'yes', 'z']])
+        assert_equal(tested, ['yes', 'no', 'yes', 'no'])
+        assert_equal(list(row_set.tuples()), [(1, 'yes', 'x'), (3, 'yes', 'z')])
+
+    def test_filter_in_chain(self):
+        # after the types, the filter sees the cast values
+        row_set = self.make_row_set(
+            offset_processor(1),
+            types_processor([IntegerType()]),
+            filter_processor(lambda a, c: a in (2, 3) and c is not None,
+                             [0, 2]))
+        assert_equal(row_set._plan()[1], [])
+        assert_equal(self.values(row_set), [[3, 'yes', 'z']])
+        assert_equal(list(row_set.tuples()), [(3, 'yes', 'z')])
+
+    def test_filter_with_select(self):
+        row_set = self.make_row_set(
+            headers_processor(['a', 'b', 'c']),
+            filter_processor(lambda b: b == 'no', ['b']))
+        row_set.select(['c'])
+        assert_equal(self.values(row_set), [[None], ['y']])
+        assert_equal(row_set.dicts().next().keys(), ['c'])
@@ -1,7 +1,17 @@
 # -*- coding: utf-8 -*-
+import datetime
+import decimal
+import pickle
 import unittest
 
-from messytables import dateparser, Cell
+from nose.tools import assert_equal
+
+from messytables import dateparser, Cell, StringType
+from messytables.types import (NumberFormat, IntegerType, DecimalType,
+                               CAST_FAILED)
+from messytables.commas import sniff_dialect, split_lines
+from messytables.util import LRUCache, ValueDictionary
+from messytables.excelx import column_index, COLUMN_INDEXES
 
 
 class DateParserTest(unittest.TestCase):
@@ -15,7 +25,189 @@ class DateParserTest(unittest.TestCase):
         assert dateparser.is_date('2012 12 22 13:17')
         assert dateparser.is_date('2012 12 22 T 13:17')
 
+    def test_date_format_detector(self):
+        detect = dateparser.DATE_DETECTOR.detect
+        assert_equal(detect('22/12/2012'), set(['%d/%m/%Y']))
+        assert_equal(detect(u'2012-12-22T13:17:01'),
+                     set(['%Y-%m-%dT%H:%M:%S']))
+        assert_equal(detect(' 2 Dec 2012'), set(['%d %b %Y', '%d %B %Y']))
+        assert_equal(detect('22.12.2012 13:17UTC'),
+                     set(['%d.%m.%Y %H:%M%Z']))
+        assert_equal(detect('22/12/12/12'), set())
+
+    def test_date_format_detector_custom_formats(self):
+        detector = dateparser.DateFormatDetector(['%d|%m|%Y', '%j %Y'])
+        assert_equal(detector.indexed, set(['%d|%m|%Y']))
+        assert_equal(detector.detect('1|2|2012'), set(['%d|%m|%Y']))
+        assert_equal(detector.detect('1/2/2012'), set())
+
+    def test_date_format_parser(self):
+        values = ['22/12/2012', ' 2/1/2012', '2/1/12', '29/02/2013',
+                  '22/13/2012', '22/12/2012 ', 'x', '', '22 Dec 2012',
+                  '22 DECEMBER 2012', '22 dec 12 13:17UTC',
+                  '2012-12-22T13:17:01', '2012-12-22T24:17:01', 'UTC 2010',
+                  'gmt 12']
+        formats = ['%d/%m/%Y', '%d/%m/%y', '%d %b %Y', '%d %B %Y',
+                   '%d %b %y %H:%M%Z', '%Z %Y', '%Y-%m-%dT%H:%M:%S',
+                   '%j %Y']
+        for format in formats:
+            parser = dateparser.DateFormatParser(format)
+            for value in values:
+                try:
+                    expected = datetime.datetime.strptime(value, format)
+                except ValueError:
+                    self.assertRaises(ValueError, parser.parse, value)
+                else:
+                    assert_equal(parser.parse(value), expected)
+        assert dateparser.DateFormatParser('%j %Y').regex is None
+
+
+class NumberFormatTest(unittest.TestCase):
+    def test_plain_numbers(self):
+        number_format = NumberFormat('', '.')
+        assert_equal(number_format.integer(u' -12 '), -12)
+        assert_equal(number_format.integer(u'1.5'), CAST_FAILED)
+        assert_equal(repr(number_format.decimal(u'-001.50')),
+                     repr(decimal.Decimal('-1.50')))
+        assert_equal(number_format.decimal(u'1.5e3'), 1500)
+        assert number_format.decimal(u'NaN').is_nan()
+        assert_equal(number_format.decimal(u'1,5'), CAST_FAILED)
+        assert_equal(number_format.decimal(u'n/a'), CAST_FAILED)
+
+    def test_separators(self):
+        number_format = NumberFormat('.', ',', parens=True, percent=True)
+        assert_equal(number_format.integer(u'1.234.567'), 1234567)
+        assert_equal(number_format.integer(u'(12)'), -12)
+        assert_equal(number_format.integer(u'12%'), CAST_FAILED)
+        assert_equal(repr(number_format.decimal(u'1.234,50')),
+                     repr(decimal.Decimal('1234.50')))
+        # numbers in Python syntax are read first
+        assert_equal(number_format.decimal(u'1.5'), decimal.Decimal('1.5'))
+        assert_equal(number_format.decimal(u'(12,5%)'),
+                     decimal.Decimal('-0.125'))
+
+    def test_types(self):
+        number_format = NumberFormat(',', '.', parens=True)
+        assert_equal(IntegerType(number_format).cast(u'(1,000)'), -1000)
+        assert_equal(DecimalType(number_format).cast(u''), None)
+        self.assertRaises(ValueError, DecimalType(number_format).cast, u'x')
+        assert_equal(DecimalType(number_format).caster()(u'x'), CAST_FAILED)
+
+    def test_floating(self):
+        number_format = NumberFormat('.', ',', parens=True, percent=True)
+        assert_equal(number_format.floating(u' 1.5e3 '), 1500.0)
+        assert_equal(number_format.floating(u'1.234,5'), 1234.5)
+        assert_equal(number_format.floating(u'(12,5%)'), -0.125)
+        assert_equal(number_format.floating(u'n/a'), CAST_FAILED)
+        assert_equal(number_format.floating(u','), CAST_FAILED)
+        value = 0.1
+        assert number_format.floating(value) is value
+        cast = DecimalType(number_format).caster('float')
+        assert_equal(type(cast(u'2')), float)
+        assert_equal(cast(u''), None)
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert len(cache) == 2
+
+
+class ValueDictionaryTest(unittest.TestCase):
+    def test_shares_values_until_full(self):
+        converted = []
+
+        def convert(value):
+            converted.append(value)
+            return value.decode('utf-8')
+        dictionary = ValueDictionary(2, convert)
+        a = dictionary.lookup('a')
+        assert dictionary.lookup('a') is a
+        dictionary.lookup('b')
+        assert_equal(converted, ['a', 'b'])
+        # a third distinct value drops the dictionary
+        assert_equal(dictionary.lookup('c'), u'c')
+        assert dictionary.dropped
+        assert_equal(len(dictionary), 0)
+        assert_equal(dictionary.lookup('a'), u'a')
+        assert_equal(converted, ['a', 'b', 'c', 'a'])
+
+
+class ColumnIndexTest(unittest.TestCase):
+    def test_column_index(self):
+        assert_equal([column_index(ref) for ref in
+                      ('A1', 'Z3', 'AB12', '$B$2', 'XFD1048576', 'ZZZZ1')],
+                     [0, 25, 27, 1, 16383, 475253])
+        # only references Excel can produce are cached
+        assert 'XFD' in COLUMN_INDEXES
+        assert 'ZZZZ' not in COLUMN_INDEXES
+
 
 class CellReprTest(unittest.TestCase):
     def test_repr_ok(self):
         repr(Cell(value=u"\xa0"))
+
+
+class CellSlotsTest(unittest.TestCase):
+    def test_cell_has_no_instance_dict(self):
+        assert not hasattr(Cell(u'a'), '__dict__')
+
+    def test_default_type_is_shared(self):
+        a, b = Cell(u'a'), Cell(u'b')
+        assert a.type is b.type
+        assert a.type == StringType()
+
+    def test_pickle_round_trip(self):
+        cell = Cell(decimal.Decimal('1.5'), column=u'price',
+                    type=DecimalType())
+        cell.column_autogenerated = True
+        for protocol in (0, 1, 2):
+            copy = pickle.loads(pickle.dumps(cell, protocol))
+            assert_equal(copy.value, cell.value)
+            assert_equal(copy.column, u'price')
+            assert copy.column_autogenerated
+            assert_equal(copy.type, DecimalType())
+
+
+class SniffDialectTest(unittest.TestCase):
+    def test_consistent_delimiter(self):
+        dialect = sniff_dialect(['a;b,c;d\n', '1;"2;3";4\n', '5;6,7;8\n'])
+        assert dialect.delimiter == ';'
+        assert dialect.quotechar == '"'
+        assert not dialect.skipinitialspace
+
+    def test_skipinitialspace(self):
+        dialect = sniff_dialect(['a, b, c\n', '1, 2, 3\n'])
+        assert dialect.delimiter == ','
+        assert dialect.skipinitialspace
+
+    def test_single_quotes_use_sniffer(self):
+        dialect = sniff_dialect(["a,'b,c',d\n", "1,'2,3',4\n"])
+        assert dialect.quotechar == "'"
+
+    def test_budget(self):
+        lines = ['a|b|c\n'] * 10 + ['a,b,c\n'] * 1000
+        assert sniff_dialect(lines, budget=60).delimiter == '|'
+        assert sniff_dialect(lines).delimiter == ','
+
+    def test_no_delimiter(self):
+        assert sniff_dialect(['foo\n', 'bar\n']) is None
+
+
+class SplitLinesTest(unittest.TestCase):
+    def test_line_endings_across_blocks(self):
+        data = 'a\r\nb\rc\n\r\nd'
+        for size in (1, 2, 3, len(data)):
+            blocks = [data[i:i + size] for i in range(0, len(data), size)]
+            assert list(split_lines(blocks)) == ['a\n', 'b\n', 'c\n',
+                                                 '\n', 'd']
+
+    def test_trailing_carriage_return(self):
+        assert list(split_lines(['a\r'])) == ['a\n']